@@ -9,6 +9,7 @@ from app.core import dependencies, utils
 from app.schemas import ErrorCode, ErrorDetail
 from datetime import timedelta
 from app.service import xunfei_aippt
+from app.service.api_config_registry import api_config_registry
 from app import crud, schemas, models
 
 router = APIRouter(prefix="", tags=["ai_ppt"])
@@ -56,12 +57,12 @@ class CreateAiPPTTaskRequest(BaseModel):
 def create_ai_ppt_task(
     request: CreateAiPPTTaskRequest,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.check_is_expired),
+    current_user: schemas.User = Depends(dependencies.check_is_expired),
 ):
     """
     创建一个AI PPT任务
     """
-    config = crud.api_config.random_get_enabled_api_config_xunfei_ai_ppt(db)
+    config = api_config_registry.random_get_enabled(models.ApiConfigXunFeiAiPPT)
     if config is None:
         raise HTTPException(
             status_code=404,
@@ -88,7 +89,7 @@ def create_ai_ppt_task(
 def get_ai_ppt_task_by_sid(
     sid: str,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.check_is_expired),
+    current_user: schemas.User = Depends(dependencies.check_is_expired),
 ):
     """
     获取一个AI PPT任务的进度
@@ -104,5 +105,5 @@ def get_ai_ppt_task_by_sid(
 @router.get("/aippt/task", response_model=List[schemas.AiPPTRecord])
 def get_ai_ppt_by_page(
     page: int = Query(1, ge=1), per_page: int = Query(10, ge=1,le=100),
-    db: Session = Depends(dependencies.get_db), current_user: models.User = Depends(dependencies.check_is_expired)):
+    db: Session = Depends(dependencies.get_db), current_user: schemas.User = Depends(dependencies.check_is_expired)):
     return crud.get_ai_ppt_records_by_user_id(db,current_user.id ,page, per_page) # type: ignore
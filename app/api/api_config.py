@@ -4,7 +4,7 @@ from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, ValidationError
 from sqlalchemy.orm import Session
 from typing import List, Literal, Required, TypedDict, Union, Sequence
-from app import crud, schemas, models
+from app import crud, schemas
 from app.core import dependencies, utils
 from app.schemas import ErrorCode, ErrorDetail
 from datetime import timedelta
@@ -76,7 +76,7 @@ def get_api_config_by_page(
 def create_api_config_doubao_glm(
     api_config: schemas.ApiConfigDouBaoGLMCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -89,7 +89,7 @@ def update_api_config_doubao_glm(
     id: int,
     api_config: schemas.ApiConfigDouBaoGLMUpdate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -107,7 +107,7 @@ def update_api_config_doubao_glm(
 def create_api_config_xunfei_ai_ppt(
     api_config: schemas.ApiConfigXunFeiAiPPTCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -120,7 +120,7 @@ def update_api_config_xunfei_ai_ppt(
     id: int,
     api_config: schemas.ApiConfigXunFeiAiPPTUpdate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -140,7 +140,7 @@ def update_api_config_xunfei_ai_ppt(
 def create_api_config_bytedance_openspeech(
     api_config: schemas.ApiConfigByteDanceOpenspeechCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -156,7 +156,7 @@ def update_api_config_bytedance_openspeech(
     id: int,
     api_config: schemas.ApiConfigByteDanceOpenspeechUpdate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["admin", "superadmin"])
     ),
 ):
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app import crud, models, schemas
+from app import crud, schemas
 from app.core import dependencies, security, utils
 from datetime import datetime, timedelta
 from app.core.config import CONFIG
@@ -11,11 +12,11 @@ router = APIRouter(prefix="", tags=["auth"])
 
 
 @router.post("/login/token", response_model=security.Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(dependencies.get_db),
+    db: AsyncSession = Depends(dependencies.get_async_db),
 ):
-    user = crud.get_user_by_username(db, form_data.username)
+    user = await crud.aio.get_user_by_username(db, form_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,7 +25,7 @@ def login_for_access_token(
             ),
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if utils.verify_password(form_data.password, str(user.hashed_password)) is False:
+    if await utils.verify_password_async(form_data.password, str(user.hashed_password)) is False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=schemas.ErrorDetail.from_error_code(
@@ -45,7 +46,7 @@ def login_for_access_token(
 
 @router.post("/refresh/token", response_model=security.Token)
 def refresh_access_token(
-    current_user: models.User = Depends(dependencies.get_current_active_user),
+    current_user: schemas.User = Depends(dependencies.get_current_active_user),
     db: Session = Depends(dependencies.get_db),
 ):
     expires_delta = timedelta(minutes=CONFIG.JWT.EXPIRE_MINUTES)
@@ -66,11 +67,11 @@ class UserRegister(BaseModel):
 
 
 @router.post("/register", response_model=schemas.User)
-def register_user(
+async def register_user(
     user: UserRegister,
-    db: Session = Depends(dependencies.get_db),
+    db: AsyncSession = Depends(dependencies.get_async_db),
 ):
-    if crud.get_user_by_username(db, username=user.username) or crud.get_user_by_email(
+    if await crud.aio.get_user_by_username(db, username=user.username) or await crud.aio.get_user_by_email(
         db, email=user.email
     ):
         raise HTTPException(
@@ -79,7 +80,7 @@ def register_user(
                 schemas.ErrorCode.ACCOUNT_ALREADY_EXISTS
             ),
         )
-    db_user = crud.create_user(
+    db_user = await crud.aio.create_user(
         db,
         user=schemas.UserCreate(
             username=user.username,
@@ -96,18 +97,18 @@ class MacAddressAuth(BaseModel):
 
 
 @router.post("/register/mac_addres", response_model=schemas.User)
-def register_user_by_mac_address(
+async def register_user_by_mac_address(
     req: MacAddressAuth,
-    db: Session = Depends(dependencies.get_db),
+    db: AsyncSession = Depends(dependencies.get_async_db),
 ):
-    if crud.get_user_by_username(db, username=req.mac_address):
+    if await crud.aio.get_user_by_username(db, username=req.mac_address):
         raise HTTPException(
             status_code=400,
             detail=schemas.ErrorDetail.from_error_code(
                 schemas.ErrorCode.ACCOUNT_ALREADY_EXISTS
             ),
         )
-    db_user = crud.create_user(
+    db_user = await crud.aio.create_device_user(
         db,
         user=schemas.UserCreate(
             username=req.mac_address,
@@ -120,11 +121,11 @@ def register_user_by_mac_address(
 
 
 @router.post("/login/token/mac_addres", response_model=security.Token)
-def login_for_access_token_by_mac_address(
+async def login_for_access_token_by_mac_address(
     req: MacAddressAuth,
-    db: Session = Depends(dependencies.get_db),
+    db: AsyncSession = Depends(dependencies.get_async_db),
 ):
-    user = crud.get_user_by_username(db, req.mac_address)
+    user = await crud.aio.get_user_by_username(db, req.mac_address)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -133,7 +134,7 @@ def login_for_access_token_by_mac_address(
             ),
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if utils.verify_password(req.mac_address, str(user.hashed_password)) is False:
+    if await utils.verify_password_async(req.mac_address, str(user.hashed_password)) is False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=schemas.ErrorDetail.from_error_code(
@@ -141,6 +142,7 @@ def login_for_access_token_by_mac_address(
             ),
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await crud.aio.upgrade_device_credential(db, user, req.mac_address)
     expires_delta = timedelta(minutes=CONFIG.JWT.EXPIRE_MINUTES)
     access_token = security.create_access_token(
         data={"sub": user.username}, expires_delta=expires_delta
@@ -154,7 +156,7 @@ def login_for_access_token_by_mac_address(
 
 @router.post("/refresh/token/mac_address", response_model=security.Token)
 def refresh_access_token_by_mac_address(
-    current_user: models.User = Depends(dependencies.get_current_active_user),
+    current_user: schemas.User = Depends(dependencies.get_current_active_user),
     db: Session = Depends(dependencies.get_db),
 ):
     expires_delta = timedelta(minutes=CONFIG.JWT.EXPIRE_MINUTES)
@@ -172,9 +174,9 @@ class LoginTokenTK(BaseModel):
     k: str = Field(..., description="加密后的参数")
 
 @router.post("/login/token/tk", response_model=security.Token)
-def login_or_register_by_tk(
+async def login_or_register_by_tk(
     req :LoginTokenTK,
-    db: Session = Depends(dependencies.get_db),
+    db: AsyncSession = Depends(dependencies.get_async_db),
 ):
     
     key = b'imm6sco23gx97qml'  # AES密钥
@@ -195,10 +197,10 @@ def login_or_register_by_tk(
         )
     
     # 检查用户是否存在
-    user = crud.get_user_by_username(db, mac_address)
+    user = await crud.aio.get_user_by_username(db, mac_address)
     if not user:
         # 如果用户不存在，则注册一个新用户
-        user = crud.create_user(db, schemas.UserCreate(username=mac_address, email=f"{mac_address}@fake.com", password=mac_address,))
+        user = await crud.aio.create_device_user(db, schemas.UserCreate(username=mac_address, email=f"{mac_address}@fake.com", password=mac_address,))
     
     # 生成访问Token
     expires_delta = timedelta(minutes=CONFIG.JWT.EXPIRE_MINUTES)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field, conint
 from sqlalchemy.orm import Session
 from typing import List
-from app import crud, schemas, models
+from app import crud, schemas
 from app.core import dependencies, utils
 from app.schemas import ErrorCode, ErrorDetail
 
@@ -19,7 +19,7 @@ def read_cdkeys(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -36,7 +36,7 @@ class CreateCdkeyRequest(BaseModel):
 def create_cdkeys(
     cdkey: CreateCdkeyRequest,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -52,7 +52,7 @@ def create_cdkeys(
 def delete_cdkey(
     cdkey_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -68,7 +68,7 @@ def delete_cdkey(
 def read_cdkey(
     cdkey_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -90,7 +90,7 @@ def update_cdkey(
     cdkey_id: int,
     cdkey: UpdateCdkeyRequest,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
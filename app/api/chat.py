@@ -1,14 +1,29 @@
+import asyncio
+import json
 import logging
 from pprint import pprint
+import anyio
 from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import List, Literal, Required, TypedDict, Union, Sequence
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Literal, Required, Tuple, TypedDict, Union, Sequence
 from app import crud, schemas, models
 from app.core import dependencies, utils
+from app.core.config import CONFIG
 from app.schemas import ErrorCode, ErrorDetail
 from datetime import timedelta
-from app.service import doubao_glm, glm_token
+from app.service import (
+    admission,
+    chat_compaction,
+    chat_history,
+    completion_cache,
+    glm_balancer,
+    glm_token,
+    model_router,
+    single_flight,
+)
+from app.service.api_config_registry import api_config_registry
 from volcenginesdkarkruntime.types.chat import (
     ChatCompletion,
 )
@@ -31,6 +46,25 @@ from volcenginesdkarkruntime.types.chat.chat_completion_assistant_message_param
 
 router = APIRouter(prefix="", tags=["aichat"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # 关闭 nginx 的响应缓冲,保证增量及时下发
+}
+
+
+def sse_event(data: str) -> str:
+    return f"data: {data}\n\n"
+
+
+def get_doubao_configs() -> List[models.ApiConfigDouBaoGLM]:
+    doubao_configs = api_config_registry.get_enabled(models.ApiConfigDouBaoGLM)
+    if not doubao_configs:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorDetail.from_error_code(ErrorCode.API_CONFIG_NOT_FOUND),
+        )
+    return doubao_configs
+
 
 class UserMessageParam(TypedDict, total=False):
     content: Required[str]
@@ -42,86 +76,262 @@ class AssistantMessageParam(TypedDict, total=False):
     role: Required[Literal["assistant"]]
 
 
+CHAT_SYSTEM_MESSAGE: ChatCompletionSystemMessageParam = {
+    "role": "system",
+    "content": "你是一个AI键盘精灵,名字叫多多,你乐于助人。",
+}
+
+
 class ChatRequest(BaseModel):
     messages: List[UserMessageParam | AssistantMessageParam]
+    stream: bool = False
+    max_tokens: int | None = Field(None, ge=1)
 
 
 @router.post("/chat/completion", response_model=ChatCompletion)
-def chat(
+async def chat(
     request: ChatRequest,
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.check_is_expired),
+    current_user: schemas.User = Depends(dependencies.check_is_expired_async),
 ):
-    system_message: ChatCompletionSystemMessageParam = {
-        "role": "system",
-        "content": "你是一个AI键盘精灵,名字叫多多,你乐于助人。",
-    }
-    messages = [system_message] + request.messages
-    random_doubao_config = crud.api_config.random_get_enabled_api_config_doubao_glm(db)
-
-    if random_doubao_config is None:
+    messages = [CHAT_SYSTEM_MESSAGE] + request.messages
+    doubao_configs = get_doubao_configs()
+    max_tokens = model_router.resolve_max_tokens(request.max_tokens)
+
+    try:
+        if request.stream:
+            route = model_router.model_router.route(
+                doubao_configs, glm_token.num_tokens_from_messages(messages), max_tokens  # type: ignore
+            )
+            doubao_config = glm_balancer.glm_balancer.choose(route.configs)
+            return StreamingResponse(
+                chat_stream_events(doubao_config, messages, current_user.id, route.max_tokens),  # type: ignore
+                media_type="text/event-stream",
+                headers=SSE_HEADERS,
+            )
+        return await complete_chat(doubao_configs, messages, current_user.id, max_tokens)  # type: ignore
+    except admission.AdmissionError:
         raise HTTPException(
-            status_code=404,
-            detail=ErrorDetail.from_error_code(ErrorCode.API_CONFIG_NOT_FOUND),
+            status_code=503,
+            detail=ErrorDetail.from_error_code(ErrorCode.UPSTREAM_BUSY),
         )
-    glm = doubao_glm.DouBaoGLM(random_doubao_config.api_key, random_doubao_config.model)  # type: ignore
 
-    completion = glm.chat(messages)  # type: ignore
+
+async def complete_chat(
+    doubao_configs: List[models.ApiConfigDouBaoGLM],
+    messages,
+    user_id: int,
+    max_tokens: int,
+) -> ChatCompletion:
+    """
+    非流式请求一次对话:按提示词长度路由,依次经过完全匹配缓存和相同请求合并
+    """
+    route = model_router.model_router.route(doubao_configs, glm_token.num_tokens_from_messages(messages), max_tokens)
+    doubao_config = glm_balancer.glm_balancer.choose(route.configs)
+    key = completion_cache.completion_key(doubao_config.model, messages, route.max_tokens)  # type: ignore
+    if CONFIG.CHAT.COMPLETION_CACHE_ENABLED:
+        if (completion := await completion_cache.get_cached_completion(key)) is not None:
+            return completion
+    if CONFIG.CHAT.SINGLE_FLIGHT_ENABLED:
+        completion = await single_flight.chat_single_flight.do(
+            key,
+            lambda: glm_balancer.chat(
+                doubao_config, messages, route.configs, user_id, max_tokens=route.max_tokens  # type: ignore
+            ),
+        )
+    else:
+        completion = await glm_balancer.chat(
+            doubao_config, messages, route.configs, user_id, max_tokens=route.max_tokens  # type: ignore
+        )
+    if CONFIG.CHAT.COMPLETION_CACHE_ENABLED:
+        await completion_cache.cache_completion(key, completion)
     return completion
 
 
+async def chat_stream_events(doubao_config: models.ApiConfigDouBaoGLM, messages, user_id: int, max_tokens: int):
+    """
+    将上游的 chunk 原样以 SSE 转发
+    """
+    try:
+        async for chunk in glm_balancer.chat_stream(doubao_config, messages, user_id, max_tokens):
+            yield sse_event(chunk.model_dump_json())
+    except admission.AdmissionError:
+        yield sse_event(json.dumps({"error": ErrorCode.UPSTREAM_BUSY.message}, ensure_ascii=False))
+    except Exception as e:
+        logging.error(f"chat stream error:{e}")
+        yield sse_event(json.dumps({"error": "哎呀！出错了。"}, ensure_ascii=False))
+    yield sse_event("[DONE]")
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[List[UserMessageParam | AssistantMessageParam]] = Field(
+        ..., min_length=1, max_length=CONFIG.CHAT.BATCH_MAX_ITEMS
+    )
+    max_tokens: int | None = Field(None, ge=1)
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    current_user: schemas.User = Depends(dependencies.check_is_expired_async),
+):
+    """
+    并发处理多组互不相关的对话,按完成顺序以 NDJSON 逐行返回,每行带有对应的 index
+    """
+    doubao_configs = get_doubao_configs()
+    return StreamingResponse(
+        chat_batch_events(
+            doubao_configs,
+            [[CHAT_SYSTEM_MESSAGE] + item for item in request.items],
+            current_user.id,  # type: ignore
+            model_router.resolve_max_tokens(request.max_tokens),
+        ),
+        media_type="application/x-ndjson",
+        headers=SSE_HEADERS,
+    )
+
+
+async def chat_batch_events(
+    doubao_configs: List[models.ApiConfigDouBaoGLM],
+    items: List[List],
+    user_id: int,
+    max_tokens: int,
+):
+    semaphore = asyncio.Semaphore(CONFIG.CHAT.BATCH_MAX_CONCURRENCY)
+
+    async def run(index: int, messages) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                completion = await complete_chat(doubao_configs, messages, user_id, max_tokens)
+                return {"index": index, "completion": completion.model_dump(mode="json")}
+            except admission.AdmissionError:
+                return {"index": index, "error": ErrorCode.UPSTREAM_BUSY.message}
+            except Exception as e:
+                logging.error(f"chat batch error:{e}")
+                return {"index": index, "error": "哎呀！出错了。"}
+
+    tasks = [asyncio.ensure_future(run(index, messages)) for index, messages in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done, ensure_ascii=False) + "\n"
+    finally:
+        # 客户端断开时取消尚未完成的请求
+        for task in tasks:
+            task.cancel()
+
+
 class ChatNextRequest(BaseModel):
     content: str
+    stream: bool = False
+    max_tokens: int | None = Field(None, ge=1)
 
 
 class ChatNextResponse(BaseModel):
     content: str
 
 
+async def build_chat_next_messages(db: AsyncSession, user_id: int, content: str) -> Tuple[List[Dict[str, str]], int]:
+    """
+    拼接系统提示、历史对话和本轮用户输入,同时返回拼接后的 token 数
+    """
+    user_message = {"role": "user", "content": content}
+    prompt_tokens = glm_token.num_tokens_from_messages([CHAT_SYSTEM_MESSAGE, user_message])
+    history = await chat_history.get_history(db, user_id)
+    if CONFIG.CHAT.COMPACTION_ENABLED:
+        chat_compaction.chat_compactor.schedule(user_id, history)
+    history = chat_history.fit_history(history, CONFIG.CHAT.HISTORY_MAX_TOKENS - prompt_tokens)
+    prompt_tokens += sum(message["token_count"] for message in history)
+    return chat_history.build_messages(CHAT_SYSTEM_MESSAGE, history, user_message), prompt_tokens
+
+
+async def save_chat_turn(user_id: int, user_content: str, assistant_content: str):
+    await chat_history.save_turn(
+        user_id,
+        [
+            chat_history.new_history_message("user", user_content),
+            chat_history.new_history_message("assistant", assistant_content),
+        ],
+    )
+
+
 @router.post("/chat/next", response_model=ChatNextResponse)
-def chat_next(
+async def chat_next(
     request: ChatNextRequest,
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.check_is_expired),
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: schemas.User = Depends(dependencies.check_is_expired_async),
 ):
-    random_doubao_config = crud.api_config.random_get_enabled_api_config_doubao_glm(db)
-    if random_doubao_config is None:
-        raise HTTPException(
-            status_code=404,
-            detail=ErrorDetail.from_error_code(ErrorCode.API_CONFIG_NOT_FOUND),
-        )
+    doubao_configs = get_doubao_configs()
+    messages, prompt_tokens = await build_chat_next_messages(db, current_user.id, request.content)  # type: ignore
+    route = model_router.model_router.route(
+        doubao_configs, prompt_tokens, model_router.resolve_max_tokens(request.max_tokens)
+    )
 
-    glm = doubao_glm.DouBaoGLM(random_doubao_config.api_key, random_doubao_config.model)  # type: ignore
-    messages = [
-        {
-            "role": "system",
-            "content": "你是一个AI键盘精灵,名字叫多多,你乐于助人。",
-        },
-        {
-            "role": "user",
-            "content": request.content,
-        },
-    ]
-    offset = 0
-    while True:
-
-        
-        chat_message = crud.get_ai_chat_message_by_user_id(db, current_user.id, offset)  # type: ignore
-        if chat_message is None:
-            break
-        messages.insert(1,{"role":chat_message.role,"content":chat_message.content}) # type: ignore
-        if glm_token.num_tokens_from_messages(messages) > 28000:
-            messages.pop(1)
-            break
-        offset = offset + 1
     try:
-        completion = glm.chat(messages)  # type: ignore
+        doubao_config = glm_balancer.glm_balancer.choose(route.configs)
+        if request.stream:
+            return StreamingResponse(
+                chat_next_stream_events(doubao_config, messages, request.content, current_user.id, route.max_tokens),  # type: ignore
+                media_type="text/event-stream",
+                headers=SSE_HEADERS,
+            )
+        completion = await glm_balancer.chat(
+            doubao_config, messages, route.configs, current_user.id, max_tokens=route.max_tokens  # type: ignore
+        )
+    except admission.AdmissionError:
+        raise HTTPException(
+            status_code=503,
+            detail=ErrorDetail.from_error_code(ErrorCode.UPSTREAM_BUSY),
+        )
     except Exception as e:
         logging.error(f"chart next error:{e}")
         return ChatNextResponse(content="哎呀！出错了。")
     if (assistant_content := completion.choices[0].message.content) is not None:
-        crud.create_ai_chat_message(db, schemas.AiChatMessageCreate(content=request.content, role="user", user_id=current_user.id)) # type: ignore
-        crud.create_ai_chat_message(db, schemas.AiChatMessageCreate(content=assistant_content, role="assistant", user_id=current_user.id)) # type: ignore
+        await save_chat_turn(current_user.id, request.content, assistant_content)  # type: ignore
         return ChatNextResponse(content=assistant_content)
     else:
         return ChatNextResponse(content="哎呀！出错了。")
+
+
+async def chat_next_stream_events(
+    doubao_config: models.ApiConfigDouBaoGLM, messages, user_content: str, user_id: int, max_tokens: int
+):
+    """
+    以 SSE 逐段下发回复内容,流结束或客户端断开时保存已生成的对话
+    """
+    assistant_chunks: List[str] = []
+    try:
+        async for chunk in glm_balancer.chat_stream(doubao_config, messages, user_id, max_tokens):
+            if not chunk.choices or not (delta := chunk.choices[0].delta.content):
+                continue
+            assistant_chunks.append(delta)
+            yield sse_event(json.dumps({"content": delta}, ensure_ascii=False))
+    except admission.AdmissionError:
+        yield sse_event(json.dumps({"content": ErrorCode.UPSTREAM_BUSY.message}, ensure_ascii=False))
+    except Exception as e:
+        logging.error(f"chart next stream error:{e}")
+        yield sse_event(json.dumps({"content": "哎呀！出错了。"}, ensure_ascii=False))
+    finally:
+        # 客户端断开时任务被取消,同样走到这里;屏蔽取消以保证已生成的内容落库
+        if assistant_content := "".join(assistant_chunks):
+            with anyio.CancelScope(shield=True):
+                try:
+                    await save_chat_turn(user_id, user_content, assistant_content)
+                except Exception as e:
+                    logging.error(f"save chat message error:{e}")
+    yield sse_event("[DONE]")
+
+
+@router.get("/chat/history", response_model=schemas.AiChatMessagePage)
+async def read_chat_history(
+    before_id: int | None = Query(None, description="上一页返回的 next_before_id,为空时从最新一条开始"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: schemas.User = Depends(dependencies.check_is_expired_async),
+):
+    """
+    按时间倒序分页读取当前用户的聊天记录
+    """
+    chat_messages = await crud.aio.get_ai_chat_messages_by_user_id(db, current_user.id, limit, before_id)  # type: ignore
+    return schemas.AiChatMessagePage(
+        messages=chat_messages,  # type: ignore
+        next_before_id=chat_messages[-1].id if len(chat_messages) == limit else None,  # type: ignore
+    )
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+from typing import Any, Dict
+from app import schemas
+from app.core import dependencies
+from app.core.compression import compression_stats
+from app.core.password_hasher import password_hasher
+from app.core.security import verified_token_cache
+from app.service import admission, completion_cache, glm_balancer, single_flight
+from app.service.api_config_registry import api_config_registry
+from app.service.user_cache import user_cache
+
+router = APIRouter(prefix="", tags=["metrics"])
+
+
+@router.get("/metrics", response_model=Dict[str, Any])
+async def read_metrics(
+    current_user: schemas.User = Depends(dependencies.check_user_role(["admin", "superadmin"])),
+):
+    return {
+        "completion_cache": await completion_cache.completion_cache.stats(),
+        "single_flight": single_flight.chat_single_flight.stats(),
+        "doubao_keys": glm_balancer.glm_balancer.stats(),
+        "admission": admission.admission_controller.stats(),
+        "content_compression": compression_stats.snapshot(),
+        "api_configs": api_config_registry.stats(),
+        "user_cache": user_cache.stats(),
+        "jwt_cache": verified_token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
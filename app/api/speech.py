@@ -2,10 +2,10 @@ import logging
 from pprint import pprint
 import uuid
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
 from typing import Dict, List
-from app import crud, schemas, models
+from app import schemas, models
 from app.core import dependencies, utils
 from app.schemas import ErrorCode, ErrorDetail
 from datetime import timedelta
@@ -14,6 +14,7 @@ from app.service.bytedance_openspeech import (
     BytedanceOpenspeechClientError,
 )
 from app.core.redis_client import redis_client
+from app.service.api_config_registry import api_config_registry
 
 router = APIRouter(prefix="", tags=["speech"])
 
@@ -72,8 +73,7 @@ class SpeechSubmitResponse(BaseModel):
 @router.post("/speech/submit", response_model=SpeechSubmitResponse)
 async def speech_submit(
     file: UploadFile = File(...),
-    user: models.User = Depends(dependencies.check_is_expired),
-    db: Session = Depends(dependencies.get_db),
+    user: schemas.User = Depends(dependencies.check_is_expired_async),
 ):
     if file.content_type != "audio/mpeg":
         raise HTTPException(
@@ -88,7 +88,7 @@ async def speech_submit(
         f.write(audio_bytes)
 
     audio_url = f"http://{server_ip}:8000/uploaded_files/audios/{unique_filename}"
-    speech_client_config = crud.random_get_enabled_api_config_bytedance_openspeech(db)
+    speech_client_config = api_config_registry.random_get_enabled(models.ApiConfigBytedanceOpenspeech)
     if not speech_client_config:
         raise HTTPException(
             status_code=404,
@@ -101,7 +101,7 @@ async def speech_submit(
         callback_url=callback_url,
     )
     try:
-        task_id = speech_client.submit(audio_url, user.username)  # type: ignore
+        task_id = await run_in_threadpool(speech_client.submit, audio_url, user.username)  # type: ignore
         redis_client.set_task(
             task_id,
             SpeechTask(status=0, username=user.username, audio_url=audio_url).model_dump(),  # type: ignore
@@ -122,7 +122,7 @@ async def speech_submit(
 @router.get("/speech/result/{task_id}", response_model=SpeechTask)
 def get_task_result(
     task_id: str,
-    user: models.User = Depends(dependencies.check_is_expired),
+    user: schemas.User = Depends(dependencies.check_is_expired),
 ):
     if not redis_client.task_exists(task_id):
         raise HTTPException(
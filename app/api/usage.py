@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List
+from app import crud, schemas
+from app.core import dependencies
+
+router = APIRouter(prefix="", tags=["usage"])
+
+
+@router.get("/usage/rollups", response_model=List[schemas.AiUsageRollup])
+def get_usage_rollups(
+    start: datetime | None = Query(None, description="默认为 24 小时前"),
+    end: datetime | None = Query(None, description="默认为当前时间"),
+    user_id: int | None = Query(None),
+    api_config_id: int | None = Query(None),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(dependencies.get_db),
+    current_user: schemas.User = Depends(dependencies.check_user_role(["admin", "superadmin"])),
+):
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    return crud.get_ai_usage_rollups(db, start, end, user_id, api_config_id, page, per_page)
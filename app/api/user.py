@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from app import crud, schemas, models
+from app import crud, schemas
 from app.core import dependencies, utils
 from app.schemas import ErrorCode, ErrorDetail, ErrorResponse
 from datetime import timedelta
@@ -11,37 +12,37 @@ router = APIRouter(prefix="", tags=["user"])
 
 
 @router.get("/users/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(dependencies.get_current_user)):
+def read_users_me(current_user: schemas.User = Depends(dependencies.get_current_user)):
     return current_user
 
 
 @router.post("/users", response_model=schemas.User)
-def create_user(
+async def create_user(
     user: schemas.UserCreate,
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"]),
     ),
 ):
 
-    if crud.get_user_by_email(db, email=user.email):
+    if await crud.aio.get_user_by_email(db, email=user.email):
         raise HTTPException(
             status_code=400,
             detail=ErrorDetail.from_error_code(ErrorCode.EMAIL_ALREADY_EXISTS),
         )
-    if crud.get_user_by_username(db, username=user.username):
+    if await crud.aio.get_user_by_username(db, username=user.username):
         raise HTTPException(
             status_code=400,
             detail=ErrorDetail.from_error_code(ErrorCode.USERNAME_ALREADY_EXISTS),
         )
-    return crud.create_user(db=db, user=user)
+    return await crud.aio.create_user(db=db, user=user)
 
 
 @router.get("/users/{user_id}", response_model=schemas.User)
 def read_user(
     user_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -55,15 +56,15 @@ def read_user(
 
 
 @router.put("/users/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     user_id: int,
     user: schemas.UserUpdate,
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
-    db_user = crud.update_user(db, user_id=user_id, user_update=user)
+    db_user = await crud.aio.update_user(db, user_id=user_id, user_update=user)
     if db_user is None:
         raise HTTPException(
             status_code=404,
@@ -76,7 +77,7 @@ def update_user(
 def delete_user(
     user_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -94,7 +95,7 @@ def read_users(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(
+    current_user: schemas.User = Depends(
         dependencies.check_user_role(["superadmin", "admin"])
     ),
 ):
@@ -109,12 +110,19 @@ class UserChangePassword(BaseModel):
 
 
 @router.put("/users/password", response_model=schemas.User)
-def change_password(
+async def change_password(
     data: UserChangePassword,
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_active_user),
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: schemas.User = Depends(dependencies.get_current_active_user),
 ):
-    if not utils.verify_password(data.old_password, str(current_user.hashed_password)):
+    # 缓存中的用户不含 hashed_password,校验旧密码需查库
+    db_user = await crud.aio.get_user(db, current_user.id)  # type: ignore
+    if db_user is None:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorDetail.from_error_code(ErrorCode.ACCOUNT_NOT_FOUND),
+        )
+    if not await utils.verify_password_async(data.old_password, str(db_user.hashed_password)):
         raise HTTPException(
             status_code=400,
             detail=ErrorDetail.from_error_code(ErrorCode.PASSWORD_INCORRECT),
@@ -124,7 +132,7 @@ def change_password(
             status_code=400,
             detail=ErrorDetail.from_error_code(ErrorCode.PASSWORD_NOT_MATCH),
         )
-    changed_db_user = crud.update_user(
+    changed_db_user = await crud.aio.update_user(
         db=db,
         user_id=current_user.id,  # type: ignore
         user_update=schemas.UserUpdate(
@@ -142,7 +150,7 @@ class UserChargeRequest(BaseModel):
 def charge_user(
     data: UserChargeRequest,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_active_user),
+    current_user: schemas.User = Depends(dependencies.get_current_active_user),
 ):
     cdkey = crud.get_cdkey_by_key(db, key=data.key)
     if cdkey is None:
@@ -161,6 +169,13 @@ def charge_user(
             detail=ErrorDetail.from_error_code(ErrorCode.CDKEY_EXPIRED),
         )
 
+    # 缓存中的到期时间可能滞后几秒,在数据库中的最新值上累加
+    db_user = crud.get_user(db, current_user.id)
+    if db_user is None:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorDetail.from_error_code(ErrorCode.ACCOUNT_NOT_FOUND),
+        )
     crud.update_cdkey(db, cdkey_id=cdkey.id, cdkey=schemas.CdkeyUpdate(status=schemas.CdkeyStatus.used))  # type: ignore
-    updated_user = crud.update_user(db, user_id=current_user.id, user_update=schemas.UserUpdate(expiration_date=current_user.expiration_date + timedelta(days=cdkey.quota)))  # type: ignore
+    updated_user = crud.update_user(db, user_id=current_user.id, user_update=schemas.UserUpdate(expiration_date=db_user.expiration_date + timedelta(days=cdkey.quota)))  # type: ignore
     return updated_user
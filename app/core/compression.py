@@ -0,0 +1,99 @@
+import base64
+import threading
+import zlib
+from typing import Dict
+from sqlalchemy.dialects import mysql
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from app.core.config import CONFIG
+
+# 压缩后的内容以此字节开头,后面是 zlib 压缩结果;UTF-8 编码中不会出现 0xFF,不带标记的内容按 UTF-8 明文读取
+COMPRESSED_MARKER = b"\xff"
+# 列类型为 Text 时写入的压缩格式:标记后面是 zlib 压缩结果的 base64,读取时仍兼容
+LEGACY_COMPRESSED_MARKER = "\x1fz1:"
+
+
+class CompressionStats:
+    """
+    本进程内写入时的压缩统计,按 UTF-8 字节计
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = 0
+        self.compressed_values = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def add(self, raw_bytes: int, stored_bytes: int, compressed: bool):
+        with self._lock:
+            self.values += 1
+            self.compressed_values += compressed
+            self.raw_bytes += raw_bytes
+            self.stored_bytes += stored_bytes
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "values": self.values,
+                "compressed_values": self.compressed_values,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "ratio": round(self.stored_bytes / self.raw_bytes, 4) if self.raw_bytes else 1.0,
+            }
+
+
+compression_stats = CompressionStats()
+
+
+def is_compressed(value: bytes) -> bool:
+    return value.startswith(COMPRESSED_MARKER)
+
+
+def compress_text(value: str) -> bytes:
+    """
+    压缩足够长且压缩后更短的文本;以旧压缩标记开头的明文总是压缩,避免读取时被误判
+    """
+    raw = value.encode("utf-8")
+    force = value.startswith(LEGACY_COMPRESSED_MARKER)
+    if not CONFIG.STORAGE.CONTENT_COMPRESSION_ENABLED and not force:
+        return raw
+    if len(raw) < CONFIG.STORAGE.CONTENT_COMPRESSION_MIN_BYTES and not force:
+        compression_stats.add(len(raw), len(raw), False)
+        return raw
+    compressed = COMPRESSED_MARKER + zlib.compress(raw, CONFIG.STORAGE.CONTENT_COMPRESSION_LEVEL)
+    if len(compressed) >= len(raw) and not force:
+        compression_stats.add(len(raw), len(raw), False)
+        return raw
+    compression_stats.add(len(raw), len(compressed), True)
+    return compressed
+
+
+def decompress_text(value: bytes) -> str:
+    if is_compressed(value):
+        return zlib.decompress(value[len(COMPRESSED_MARKER) :]).decode("utf-8")
+    text = value.decode("utf-8")
+    if text.startswith(LEGACY_COMPRESSED_MARKER):
+        return zlib.decompress(base64.b64decode(text[len(LEGACY_COMPRESSED_MARKER) :])).decode("utf-8")
+    return text
+
+
+class CompressedText(TypeDecorator):
+    """
+    透明压缩的文本列,数据库中是二进制(MySQL 为 MEDIUMBLOB),读写时自动压缩和解压
+    """
+
+    impl = LargeBinary().with_variant(mysql.MEDIUMBLOB(), "mysql")
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # 尚未执行 migrate 的 TEXT 列读出的是 str
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return decompress_text(bytes(value))
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Literal
 from pydantic import BaseModel
 import yaml
 
@@ -15,6 +15,130 @@ class JWTSettings(BaseModel):
     SECRET_KEY: str
     ALGORITHM: str
     EXPIRE_MINUTES: int
+    # 已验证 token 的进程内 LRU,按 token 摘要缓存声明,到 exp 时失效
+    DECODE_CACHE_ENABLED: bool = True
+    DECODE_CACHE_MAX_SIZE: int = 10000
+
+
+class ChatSettings(BaseModel):
+    # 历史对话(含系统提示和本轮输入)的 token 上限
+    HISTORY_MAX_TOKENS: int = 28000
+    # Redis 中每个用户最近对话的缓存,按条数和 token 总数截断
+    HISTORY_CACHE_ENABLED: bool = True
+    HISTORY_CACHE_MAX_MESSAGES: int = 200
+    HISTORY_CACHE_MAX_TOKENS: int = 28000
+    HISTORY_CACHE_TTL_SECONDS: int = 3 * 24 * 3600
+    # 聊天消息异步批量写库;队列满时 OVERFLOW_POLICY 为 sync 则等待队列腾出空间(最多 PUT_TIMEOUT 秒,超时丢弃并记录日志),
+    # 为 drop 则直接丢弃并记录日志。写库失败的批次按指数退避重试(间隔不超过 RETRY_MAX_SECONDS),
+    # 重试期间后续批次不会越过它写入;停止时最多再重试 SHUTDOWN_RETRIES 次
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_QUEUE_SIZE: int = 10000
+    WRITE_BEHIND_BATCH_SIZE: int = 200
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS: float = 0.5
+    WRITE_BEHIND_OVERFLOW_POLICY: Literal["sync", "drop"] = "sync"
+    WRITE_BEHIND_PUT_TIMEOUT_SECONDS: float = 10
+    WRITE_BEHIND_RETRY_MAX_SECONDS: float = 30
+    WRITE_BEHIND_SHUTDOWN_RETRIES: int = 3
+    # 历史超过阈值后,把较早的对话压缩为一条摘要,只保留最近 KEEP_RECENT_TOKENS 的原文
+    COMPACTION_ENABLED: bool = False
+    COMPACTION_THRESHOLD_TOKENS: int = 16000
+    COMPACTION_KEEP_RECENT_TOKENS: int = 4000
+    COMPACTION_SUMMARY_MAX_TOKENS: int = 1024
+    COMPACTION_SUMMARIZER: Literal["doubao", "stub"] = "doubao"
+    # /chat/completion 的完全匹配缓存,按模型和规范化后的 messages 计算 key
+    COMPLETION_CACHE_ENABLED: bool = False
+    COMPLETION_CACHE_TTL_SECONDS: int = 3600
+    COMPLETION_CACHE_MAX_ENTRIES: int = 10000
+    COMPLETION_CACHE_MAX_BYTES: int = 64 * 1024
+    # 合并相同的并发请求;开启 REDIS 时跨 worker 通过锁合并
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_REDIS_ENABLED: bool = False
+    SINGLE_FLIGHT_LOCK_TTL_MS: int = 60000
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 60
+    SINGLE_FLIGHT_POLL_INTERVAL_SECONDS: float = 0.1
+    # /chat/batch 单次请求的最大条数,以及同一批内同时进行的上游请求数
+    BATCH_MAX_ITEMS: int = 50
+    BATCH_MAX_CONCURRENCY: int = 8
+
+
+class UpstreamSettings(BaseModel):
+    # 豆包 key 的负载均衡:p2c 随机取两个比较得分,least_outstanding 取进行中请求最少的
+    BALANCER_STRATEGY: Literal["p2c", "least_outstanding"] = "p2c"
+    BALANCER_EWMA_ALPHA: float = 0.3
+    # 返回 429/5xx 的 key 被摘除一段时间,连续摘除时时长翻倍直到上限
+    BALANCER_EJECT_SECONDS: float = 30
+    BALANCER_MAX_EJECT_SECONDS: float = 300
+    # 连续失败 FAILURE_THRESHOLD 次后熔断,RESET_SECONDS 后放行少量探测请求
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30
+    BREAKER_HALF_OPEN_MAX_CALLS: int = 1
+    # 单次上游请求的超时;流式请求为首个 chunk 的超时,之后按 chunk 间隔计算
+    REQUEST_TIMEOUT_SECONDS: float = 60
+    STREAM_IDLE_TIMEOUT_SECONDS: float = 30
+    # 超过该 key 延迟的 PERCENTILE 分位(不低于 MIN_DELAY)仍未返回时,向另一个 key 发出对冲请求
+    HEDGING_ENABLED: bool = False
+    HEDGING_PERCENTILE: float = 0.95
+    HEDGING_MIN_DELAY_SECONDS: float = 1.0
+    # 每个 key 的准入控制,key 未单独配置 max_concurrency/max_qps 时使用这里的默认值;
+    # 超出的请求按用户轮转排队,队列满或排队超时返回 UPSTREAM_BUSY
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_DEFAULT_MAX_CONCURRENCY: int = 32
+    ADMISSION_DEFAULT_MAX_QPS: float = 20
+    ADMISSION_MAX_QUEUE_SIZE: int = 200
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10
+    # 内存中累计的 token 用量写入 ai_usage_rollups 的间隔
+    USAGE_FLUSH_INTERVAL_SECONDS: int = 60
+    # 提示词不超过 SHORT_PROMPT_TOKENS 时优先使用带 FAST_TAG 的 key,否则优先 LONG_CONTEXT_TAG;
+    # 剩余上下文不足 MIN_COMPLETION_TOKENS 的模型不参与
+    ROUTING_SHORT_PROMPT_TOKENS: int = 1024
+    ROUTING_FAST_TAG: str = "fast"
+    ROUTING_LONG_CONTEXT_TAG: str = "long-context"
+    ROUTING_MIN_COMPLETION_TOKENS: int = 256
+    # 请求未指定 max_tokens 时的默认值,以及客户端可指定的上限
+    DEFAULT_MAX_TOKENS: int = 4096
+    MAX_TOKENS_LIMIT: int = 8192
+    # 启用的 api 配置缓存在各进程内存中,增改后通过 Redis 频道通知各进程重新加载,并定期全量刷新兜底
+    API_CONFIG_REFRESH_INTERVAL_SECONDS: int = 300
+    API_CONFIG_INVALIDATE_CHANNEL: str = "api_config:invalidate"
+
+
+class StorageSettings(BaseModel):
+    # 聊天内容超过 MIN_BYTES 时以 zlib 压缩后存储;关闭后新数据按明文写入,已压缩的数据仍可读取
+    CONTENT_COMPRESSION_ENABLED: bool = True
+    CONTENT_COMPRESSION_MIN_BYTES: int = 256
+    CONTENT_COMPRESSION_LEVEL: int = 6
+    # 后台任务分批压缩已有的明文消息
+    RECOMPRESS_JOB_ENABLED: bool = True
+    RECOMPRESS_BATCH_SIZE: int = 500
+    RECOMPRESS_INTERVAL_SECONDS: int = 30
+    # 把超过 MAX_AGE_DAYS 天或每个用户最新 KEEP_PER_USER 条之外的消息移入 ai_chat_messages_archive,0 表示不按该条件归档;
+    # 每批 BATCH_SIZE 条一个事务,每次运行最多 MAX_BATCHES_PER_RUN 批、检查 USERS_PER_RUN 个用户
+    RETENTION_ENABLED: bool = False
+    RETENTION_MAX_AGE_DAYS: int = 180
+    RETENTION_KEEP_PER_USER: int = 0
+    RETENTION_BATCH_SIZE: int = 500
+    RETENTION_MAX_BATCHES_PER_RUN: int = 20
+    RETENTION_USERS_PER_RUN: int = 200
+    RETENTION_INTERVAL_SECONDS: int = 600
+
+
+class AuthSettings(BaseModel):
+    # 已认证用户的两级缓存:进程内 LRU 在前、Redis 在后,均只保留几秒;
+    # 用户被修改或删除时主动失效,并通过 Redis 频道通知其他进程清除本地副本
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_LOCAL_TTL_SECONDS: float = 2
+    USER_CACHE_REDIS_TTL_SECONDS: int = 5
+    USER_CACHE_INVALIDATE_CHANNEL: str = "auth:user:invalidate"
+    # 以设备 id 作为密码的设备用户改存 HMAC-SHA256,登录时不再计算 bcrypt;已有的 bcrypt 设备用户在下次登录时迁移。
+    # 未配置 SECRET 时使用 JWT.SECRET_KEY,更换密钥会使已有的设备凭证失效
+    DEVICE_CREDENTIAL_ENABLED: bool = True
+    DEVICE_CREDENTIAL_SECRET: str | None = None
+    # bcrypt 的 cost(新哈希生效,已有哈希按各自的 cost 校验);bcrypt 在专用线程池中计算,
+    # 执行中加排队的任务超过 WORKERS + MAX_QUEUE_SIZE 时直接返回 503
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE_SIZE: int = 32
 
 
 class AppSettings(BaseModel):
@@ -27,6 +151,10 @@ class AppConfig(BaseModel):
     APP: AppSettings
     MYSQL: MYSQLSettings
     JWT: JWTSettings
+    CHAT: ChatSettings = ChatSettings()
+    UPSTREAM: UpstreamSettings = UpstreamSettings()
+    STORAGE: StorageSettings = StorageSettings()
+    AUTH: AuthSettings = AuthSettings()
 
     @classmethod
     def from_yaml(cls, file_path: str):
@@ -3,8 +3,10 @@ from typing import List, Optional
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from app.core.security import verify_access_token
-from app import crud, models, schemas
-from app.core.database import SessionLocal
+from app import crud, schemas
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.service.user_cache import user_cache
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security.utils import get_authorization_scheme_param
 
@@ -17,6 +19,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 class CustomOAuth2PasswordBearer(OAuth2PasswordBearer):
     def __init__(self, tokenUrl: str):
         super().__init__(tokenUrl=tokenUrl)
@@ -41,10 +48,17 @@ class CustomOAuth2PasswordBearer(OAuth2PasswordBearer):
 oauth2_scheme = CustomOAuth2PasswordBearer(tokenUrl="api/login/token")
 
 
+def get_cached_user(db: Session, username: str) -> schemas.User | None:
+    """
+    按 username 读取当前用户,优先命中缓存;返回的 schemas.User 不含 hashed_password
+    """
+    return user_cache.get(username, lambda: crud.get_user_by_username(db, username=username))
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-):
+) -> schemas.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail=schemas.ErrorDetail.from_error_code(
@@ -53,7 +67,7 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_access_token(token, credentials_exception)
-    user = crud.get_user_by_username(db, username=token_data.username)
+    user = get_cached_user(db, token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -62,7 +76,7 @@ def get_current_user(
 def get_current_active_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-):
+) -> schemas.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail=schemas.ErrorDetail.from_error_code(
@@ -71,7 +85,37 @@ def get_current_active_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_access_token(token, credentials_exception)
-    user = crud.get_user_by_username(db, username=token_data.username)
+    user = get_cached_user(db, token_data.username)
+    if user is None:
+        raise credentials_exception
+    if bool(user.disabled):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=schemas.ErrorDetail.from_error_code(
+                schemas.ErrorCode.ACCOUNT_DISABLED
+            ),
+        )
+    return user
+
+
+async def get_current_active_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> schemas.User:
+    """
+    get_current_active_user 的异步版本,供 async 接口使用
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=schemas.ErrorDetail.from_error_code(
+            schemas.ErrorCode.TOKEN_VALIDATION_ERROR
+        ),
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = verify_access_token(token, credentials_exception)
+    user = await user_cache.aget(
+        token_data.username, lambda: crud.aio.get_user_by_username(db, username=token_data.username)
+    )
     if user is None:
         raise credentials_exception
     if bool(user.disabled):
@@ -85,7 +129,7 @@ def get_current_active_user(
 
 
 def check_user_role(required_roles: List[str]):
-    def role_checker(current_user: models.User = Depends(get_current_active_user)):
+    def role_checker(current_user: schemas.User = Depends(get_current_active_user)):
         if current_user.role not in required_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -99,7 +143,19 @@ def check_user_role(required_roles: List[str]):
 
 
 def check_is_expired(
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: schemas.User = Depends(get_current_active_user),
+):
+    is_expired: bool = bool(current_user.expiration_date < datetime.now())
+    if is_expired:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=schemas.ErrorDetail.from_error_code(schemas.ErrorCode.IS_EXPIRED),
+        )
+    return current_user
+
+
+async def check_is_expired_async(
+    current_user: schemas.User = Depends(get_current_active_user_async),
 ):
     is_expired: bool = bool(current_user.expiration_date < datetime.now())
     if is_expired:
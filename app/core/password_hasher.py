@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+from app.core.config import CONFIG
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """
+    bcrypt 线程池和等待队列都已占满,调用方应直接返回 503
+    """
+
+
+class TimingStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_seconds": self.total / self.count if self.count else 0.0,
+            "max_seconds": self.max,
+        }
+
+
+class PasswordHasher:
+    """
+    bcrypt 专用的有界线程池,与 FastAPI/anyio 共用的线程池隔离,登录高峰不会拖慢其他同步接口
+
+    bcrypt 计算时释放 GIL,线程池即可利用多核;排队中和执行中的任务总数超过上限时立即拒绝
+    """
+
+    def __init__(self, max_workers: int, max_queue_size: int):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.wait_stats = TimingStats()
+        self.hash_stats = TimingStats()
+
+    def submit(self, fn: Callable[..., T], *args) -> "Future[T]":
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        submitted_at = time.monotonic()
+        try:
+            return self._executor.submit(self._run, submitted_at, fn, *args)
+        except BaseException:
+            self._done()
+            raise
+
+    def run(self, fn: Callable[..., T], *args) -> T:
+        """
+        在同步代码中使用,阻塞直到计算完成
+        """
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "wait": self.wait_stats.snapshot(),
+            "hash": self.hash_stats.snapshot(),
+        }
+
+    def _run(self, submitted_at: float, fn: Callable[..., T], *args) -> T:
+        started_at = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.monotonic()
+            with self._lock:
+                self.wait_stats.record(started_at - submitted_at)
+                self.hash_stats.record(finished_at - started_at)
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+
+password_hasher = PasswordHasher(
+    max_workers=CONFIG.AUTH.PASSWORD_HASH_WORKERS,
+    max_queue_size=CONFIG.AUTH.PASSWORD_HASH_MAX_QUEUE_SIZE,
+)
@@ -1,5 +1,8 @@
-from typing import Dict
+import logging
+import threading
+from typing import Callable, Dict, List
 import redis
+from redis import asyncio as aioredis
 
 
 class RedisClient:
@@ -23,3 +26,80 @@ class RedisClient:
 
 
 redis_client = RedisClient(host="localhost", port=6379, db=0)
+
+# 供异步接口使用,避免同步客户端阻塞事件循环
+async_redis_client = aioredis.Redis(host="localhost", port=6379, db=0)
+
+
+class RedisSubscriber:
+    """
+    后台线程订阅若干 Redis 频道,收到消息时调用对应的回调,用于进程间的缓存失效通知
+
+    订阅成功(包括断线重连)后调用 on_connect 回调,由使用方处理期间可能错过的通知
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._handlers: Dict[str, List[Callable[[bytes], None]]] = {}
+        self._on_connect: List[Callable[[], None]] = []
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(
+        self,
+        channel: str,
+        handler: Callable[[bytes], None],
+        on_connect: Callable[[], None] | None = None,
+    ):
+        """
+        注册频道及其回调,需在 start 之前调用
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+        if on_connect is not None:
+            self._on_connect.append(on_connect)
+
+    def start(self):
+        if self._thread is not None or not self._handlers:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="redis-subscriber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(5)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(*self._handlers)
+                for on_connect in self._on_connect:
+                    self._call(on_connect)
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    for handler in self._handlers.get(message["channel"].decode("utf-8"), []):
+                        self._call(handler, message["data"])
+            except Exception as e:
+                logging.error(f"redis subscriber error:{e}")
+                self._stopping.wait(5)
+            finally:
+                pubsub.close()
+
+    def _call(self, callback: Callable, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error(f"redis subscriber callback error:{e}")
+
+
+redis_subscriber = RedisSubscriber(redis_client.client)
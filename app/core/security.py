@@ -5,6 +5,10 @@ from app.core.config import CONFIG
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from typing import Tuple
 
 class TokenData(BaseModel):
@@ -30,7 +34,74 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
+class VerifiedTokenCache:
+    """
+    已验证 token 的 LRU,键为 token 的 sha256 摘要,值为解析出的声明及其 exp
+
+    命中时跳过签名校验和 JSON 解析;条目在 exp 时刻失效,与 jwt.decode 的判断一致。
+    没有 exp 的 token 不缓存
+    """
+
+    def __init__(self, max_size: int, enabled: bool = True):
+        self.max_size = max_size
+        self.enabled = enabled
+        self._tokens: OrderedDict[bytes, Tuple[float, TokenData]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _key(self, token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> TokenData | None:
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            item = self._tokens.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            exp, token_data = item
+            if exp <= time.time():
+                del self._tokens[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._tokens.move_to_end(key)
+            self.hits += 1
+            return token_data
+
+    def put(self, token: str, exp: float, token_data: TokenData):
+        if not self.enabled:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._tokens[key] = (exp, token_data)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+
+verified_token_cache = VerifiedTokenCache(
+    max_size=CONFIG.JWT.DECODE_CACHE_MAX_SIZE,
+    enabled=CONFIG.JWT.DECODE_CACHE_ENABLED,
+)
+
+
 def verify_access_token(token: str, credentials_exception):
+    if (token_data := verified_token_cache.get(token)) is not None:
+        return token_data
     try:
         payload = jwt.decode(
             token, CONFIG.JWT.SECRET_KEY, algorithms=[CONFIG.JWT.ALGORITHM]
@@ -41,6 +112,8 @@ def verify_access_token(token: str, credentials_exception):
         token_data = TokenData(username=username)
     except jwt.PyJWTError:
         raise credentials_exception
+    if isinstance(exp := payload.get("exp"), (int, float)):
+        verified_token_cache.put(token, exp, token_data)
     return token_data
 
 
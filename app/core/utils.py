@@ -1,25 +1,73 @@
+import hashlib
+import hmac
 import logging
 import uuid
 import bcrypt
 import requests
 from sqlalchemy.orm import Session
 from app import models
+from app.core.config import CONFIG
+from app.core.password_hasher import password_hasher
+
+DEVICE_CREDENTIAL_PREFIX = "hmac$"
 
 
 def hash_password(password: str) -> str:
     """Hash a password for storing."""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
-    return hashed.decode("utf-8")
+    return password_hasher.run(bcrypt_hash, password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a stored password against one provided by user."""
+    if is_device_credential(hashed_password):
+        return verify_device_credential(plain_password, hashed_password)
+    return password_hasher.run(bcrypt_check, plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password 的异步版本,等待 bcrypt 时不占用线程"""
+    return await password_hasher.run_async(bcrypt_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password 的异步版本,等待 bcrypt 时不占用线程"""
+    if is_device_credential(hashed_password):
+        return verify_device_credential(plain_password, hashed_password)
+    return await password_hasher.run_async(bcrypt_check, plain_password, hashed_password)
+
+
+def bcrypt_hash(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=CONFIG.AUTH.BCRYPT_ROUNDS)
+    hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
+    return hashed.decode("utf-8")
+
+
+def bcrypt_check(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
 
 
+def verify_device_credential(device_id: str, hashed_password: str) -> bool:
+    return hmac.compare_digest(
+        hash_device_credential(device_id).encode("utf-8"),
+        hashed_password.encode("utf-8"),
+    )
+
+
+def hash_device_credential(device_id: str) -> str:
+    """设备凭证:设备 id 的 HMAC-SHA256,带 hmac$ 前缀与 bcrypt 哈希区分"""
+    secret = CONFIG.AUTH.DEVICE_CREDENTIAL_SECRET or CONFIG.JWT.SECRET_KEY
+    digest = hmac.new(
+        secret.encode("utf-8"), device_id.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return DEVICE_CREDENTIAL_PREFIX + digest
+
+
+def is_device_credential(hashed_password: str) -> bool:
+    return hashed_password.startswith(DEVICE_CREDENTIAL_PREFIX)
+
+
 def generate_unique_cdkey(db: Session) -> str:
     """生成唯一的 xxxx-xxxx-xxxx-xxxx 格式的 CDKey"""
     while True:
@@ -2,4 +2,6 @@ from .user import *
 from .cdkey import *
 from .api_config import *
 from .ai_chat_message import *
-from .aippt import *
\ No newline at end of file
+from .aippt import *
+from .ai_usage import *
+from . import aio
\ No newline at end of file
@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
 import logging
-from typing import List
-from sqlalchemy import desc, func, select, insert, update, delete
+from typing import List, Tuple
+from sqlalchemy import LargeBinary, bindparam, desc, func, select, insert, type_coerce, update, delete
 from sqlalchemy.orm import Session
 from app import schemas, models
 from app.core import utils
+from app.core.compression import compress_text, decompress_text, is_compressed
+from app.service import glm_token
 
 
 def create_ai_chat_message(
@@ -12,12 +14,32 @@ def create_ai_chat_message(
     new_ai_chat_message:schemas.AiChatMessageCreate
 ) :
     db_chat_message = models.AiChatMessage(**new_ai_chat_message.model_dump())
+    if db_chat_message.token_count is None:
+        db_chat_message.token_count = glm_token.num_tokens_from_message(  # type: ignore
+            {"role": new_ai_chat_message.role, "content": new_ai_chat_message.content}
+        )
 
     db.add(db_chat_message)
     db.commit()
     db.refresh(db_chat_message)
     return db_chat_message
 
+def create_ai_chat_messages(
+    db: Session,
+    new_ai_chat_messages: List[schemas.AiChatMessageCreate]
+) :
+    """
+    批量写入消息,一条多行 INSERT,不回读生成的 id
+    """
+    rows = [new_ai_chat_message.model_dump() for new_ai_chat_message in new_ai_chat_messages]
+    for row in rows:
+        if row["token_count"] is None:
+            row["token_count"] = glm_token.num_tokens_from_message(
+                {"role": row["role"], "content": row["content"]}
+            )
+    db.execute(insert(models.AiChatMessage), rows)
+    db.commit()
+
 def get_ai_chat_message_by_user_id(
     db: Session,
     user_id: int,
@@ -29,4 +51,186 @@ def get_ai_chat_message_by_user_id(
         .order_by(desc(models.AiChatMessage.id))
         .offset(offset)
         .first()
-    )
\ No newline at end of file
+    )
+
+
+def get_ai_chat_messages_by_user_id(
+    db: Session,
+    user_id: int,
+    limit: int,
+    before_id: int | None = None,
+    after_id: int | None = None,
+) -> List[models.AiChatMessage]:
+    """
+    按 id 倒序取一页历史消息,before_id 为上一页最后一条的 id(keyset 分页),after_id 为下界(不含)
+    """
+    query = db.query(models.AiChatMessage).filter(models.AiChatMessage.user_id == user_id)
+    if before_id is not None:
+        query = query.filter(models.AiChatMessage.id < before_id)
+    if after_id is not None:
+        query = query.filter(models.AiChatMessage.id > after_id)
+    return query.order_by(desc(models.AiChatMessage.id)).limit(limit).all()
+
+
+
+def backfill_ai_chat_message_token_count(
+    db: Session,
+    after_id: int,
+    limit: int,
+) -> int | None:
+    """
+    为 id > after_id 且缺少 token_count 的一批消息补算 token 数,返回本批最后一条的 id,没有数据时返回 None
+    """
+    db_chat_messages = (
+        db.query(models.AiChatMessage)
+        .filter(
+            models.AiChatMessage.id > after_id,
+            models.AiChatMessage.token_count.is_(None),
+        )
+        .order_by(models.AiChatMessage.id)
+        .limit(limit)
+        .all()
+    )
+    if not db_chat_messages:
+        return None
+    token_counts = glm_token.tokenizer_registry.get().encode_batch(
+        [{"role": m.role, "content": m.content} for m in db_chat_messages]  # type: ignore
+    )
+    for db_chat_message, token_count in zip(db_chat_messages, token_counts):
+        db_chat_message.token_count = token_count  # type: ignore
+    db.commit()
+    return db_chat_messages[-1].id  # type: ignore
+
+
+
+def recompress_ai_chat_messages(
+    db: Session,
+    after_id: int,
+    limit: int,
+) -> Tuple[int | None, int]:
+    """
+    压缩 id > after_id 的一批消息中仍为明文或旧 base64 格式的内容,
+    返回本批最后一条的 id(没有数据时为 None)和改写的条数
+    """
+    table = models.AiChatMessage.__table__
+    # 按二进制读写原始内容,绕过 CompressedText 的自动解压和压缩
+    rows = db.execute(
+        select(table.c.id, type_coerce(table.c.content, LargeBinary))
+        .where(table.c.id > after_id)
+        .order_by(table.c.id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return None, 0
+    updates = []
+    for message_id, content in rows:
+        if is_compressed(content):
+            continue
+        if (compressed := compress_text(decompress_text(content))) != content:
+            updates.append({"message_id": message_id, "compressed": compressed})
+    if updates:
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("message_id"))
+            .values(content=bindparam("compressed", type_=LargeBinary)),
+            updates,
+        )
+        db.commit()
+    return rows[-1][0], len(updates)
+
+
+def get_expired_ai_chat_message_ids(
+    db: Session,
+    before: datetime,
+    limit: int,
+) -> List[int]:
+    """
+    按 id 从小到大取一批 created_at 早于 before 的消息 id,遇到第一条未过期的消息即停止
+
+    id 随时间递增,因此只需按主键顺序扫描。migrate 加列时已有行的 created_at 为加列时刻,
+    这些旧消息要到加列 RETENTION_MAX_AGE_DAYS 天之后才会按年龄归档;created_at 为空的消息年龄未知,不按年龄归档
+    """
+    rows = db.execute(
+        select(models.AiChatMessage.id, models.AiChatMessage.created_at)
+        .order_by(models.AiChatMessage.id)
+        .limit(limit)
+    ).all()
+    message_ids = []
+    for message_id, created_at in rows:
+        if created_at is None or created_at >= before:
+            break
+        message_ids.append(message_id)
+    return message_ids
+
+
+def get_ai_chat_message_ids_beyond_latest(
+    db: Session,
+    user_id: int,
+    keep: int,
+    limit: int,
+) -> List[int]:
+    """
+    取该用户最新 keep 条之外的一批消息 id
+    """
+    boundary_id = db.execute(
+        select(models.AiChatMessage.id)
+        .where(models.AiChatMessage.user_id == user_id)
+        .order_by(desc(models.AiChatMessage.id))
+        .offset(keep - 1)
+        .limit(1)
+    ).scalar()
+    if boundary_id is None:
+        return []
+    return list(
+        db.execute(
+            select(models.AiChatMessage.id)
+            .where(
+                models.AiChatMessage.user_id == user_id,
+                models.AiChatMessage.id < boundary_id,
+            )
+            .order_by(models.AiChatMessage.id)
+            .limit(limit)
+        ).scalars()
+    )
+
+
+def archive_ai_chat_messages(db: Session, message_ids: List[int]) -> int:
+    """
+    在一个短事务内把指定消息复制到归档表并从热表删除,返回归档的条数
+    """
+    if not message_ids:
+        return 0
+    source = models.AiChatMessage.__table__
+    columns = ["id", "user_id", "role", "content", "token_count", "created_at"]
+    db.execute(
+        insert(models.AiChatMessageArchive.__table__).from_select(
+            columns,
+            select(*[source.c[column] for column in columns]).where(source.c.id.in_(message_ids)),
+        )
+    )
+    result = db.execute(delete(source).where(source.c.id.in_(message_ids)))
+    db.commit()
+    return result.rowcount
+
+
+def create_ai_chat_summary(
+    db: Session,
+    new_ai_chat_summary: schemas.AiChatSummaryCreate
+) :
+    db_chat_summary = models.AiChatSummary(**new_ai_chat_summary.model_dump())
+    db.add(db_chat_summary)
+    db.commit()
+    db.refresh(db_chat_summary)
+    return db_chat_summary
+
+
+def get_latest_ai_chat_summary(
+    db: Session,
+    user_id: int
+) -> models.AiChatSummary | None:
+    return (
+        db.query(models.AiChatSummary)
+        .filter(models.AiChatSummary.user_id == user_id)
+        .order_by(desc(models.AiChatSummary.id))
+        .first()
+    )
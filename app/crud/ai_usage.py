@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import desc, func
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from app import schemas, models
+
+
+def upsert_ai_usage_rollups(db: Session, rollups: List[schemas.AiUsageRollupCreate]):
+    """
+    批量累加用量,已存在的 (user_id, api_config_id, model, hour) 行在原值上相加
+    """
+    if not rollups:
+        return
+    table = models.AiUsageRollup
+    stmt = insert(table).values([rollup.model_dump() for rollup in rollups])
+    stmt = stmt.on_duplicate_key_update(
+        requests=table.requests + stmt.inserted.requests,
+        prompt_tokens=table.prompt_tokens + stmt.inserted.prompt_tokens,
+        completion_tokens=table.completion_tokens + stmt.inserted.completion_tokens,
+        total_tokens=table.total_tokens + stmt.inserted.total_tokens,
+        updated_at=func.now(),
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def get_ai_usage_rollups(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    user_id: int | None = None,
+    api_config_id: int | None = None,
+    page: int = 1,
+    per_page: int = 100,
+):
+    query = db.query(models.AiUsageRollup).filter(
+        models.AiUsageRollup.hour >= start,
+        models.AiUsageRollup.hour < end,
+    )
+    if user_id is not None:
+        query = query.filter(models.AiUsageRollup.user_id == user_id)
+    if api_config_id is not None:
+        query = query.filter(models.AiUsageRollup.api_config_id == api_config_id)
+    return (
+        query.order_by(desc(models.AiUsageRollup.hour), models.AiUsageRollup.id)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .all()
+    )
@@ -0,0 +1,3 @@
+# crud 的异步版本,函数名与 app.crud 中同步版本一致,参数为 AsyncSession
+from .user import *
+from .ai_chat_message import *
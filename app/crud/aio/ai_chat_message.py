@@ -0,0 +1,41 @@
+from typing import List
+from sqlalchemy import desc, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas, models
+from app.service import glm_token
+
+
+async def create_ai_chat_messages(
+    db: AsyncSession,
+    new_ai_chat_messages: List[schemas.AiChatMessageCreate],
+):
+    """
+    批量写入消息,一条多行 INSERT,不回读生成的 id
+    """
+    rows = [new_ai_chat_message.model_dump() for new_ai_chat_message in new_ai_chat_messages]
+    for row in rows:
+        if row["token_count"] is None:
+            row["token_count"] = glm_token.num_tokens_from_message(
+                {"role": row["role"], "content": row["content"]}
+            )
+    await db.execute(insert(models.AiChatMessage), rows)
+    await db.commit()
+
+
+async def get_ai_chat_messages_by_user_id(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    before_id: int | None = None,
+    after_id: int | None = None,
+) -> List[models.AiChatMessage]:
+    """
+    按 id 倒序取一页历史消息,before_id 为上一页最后一条的 id(keyset 分页),after_id 为下界(不含)
+    """
+    query = select(models.AiChatMessage).where(models.AiChatMessage.user_id == user_id)
+    if before_id is not None:
+        query = query.where(models.AiChatMessage.id < before_id)
+    if after_id is not None:
+        query = query.where(models.AiChatMessage.id > after_id)
+    result = await db.scalars(query.order_by(desc(models.AiChatMessage.id)).limit(limit))
+    return list(result.all())
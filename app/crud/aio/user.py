@@ -0,0 +1,84 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas
+from app.core import utils
+from app.core.config import CONFIG
+from app.service.user_cache import user_cache
+
+
+async def get_user(db: AsyncSession, user_id: int) -> models.User | None:
+    return await db.get(models.User, user_id)
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> models.User | None:
+    return await db.scalar(select(models.User).where(models.User.username == username))
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> models.User | None:
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    return await _create_user(db, user, await utils.hash_password_async(user.password))
+
+
+async def create_device_user(db: AsyncSession, user: schemas.UserCreate):
+    """
+    创建以设备 id 作为密码的设备用户;开启设备凭证时密码存为 HMAC,不计算 bcrypt
+    """
+    if not CONFIG.AUTH.DEVICE_CREDENTIAL_ENABLED:
+        return await create_user(db, user)
+    return await _create_user(db, user, utils.hash_device_credential(user.password))
+
+
+async def upgrade_device_credential(db: AsyncSession, db_user: models.User, device_id: str) -> models.User:
+    """
+    设备用户登录成功后调用,把仍为 bcrypt 的密码迁移为 HMAC 设备凭证
+    """
+    if not CONFIG.AUTH.DEVICE_CREDENTIAL_ENABLED or utils.is_device_credential(str(db_user.hashed_password)):
+        return db_user
+    db_user.hashed_password = utils.hash_device_credential(device_id)  # type: ignore
+    await db.commit()
+    return db_user
+
+
+async def _create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
+    db_user = models.User(
+        username=user.username,
+        email=user.email,
+        hashed_password=hashed_password,
+        full_name=user.full_name,
+        disabled=user.disabled,
+        role=user.role,
+        expiration_date=user.expiration_date,
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate):
+    db_user = await db.get(models.User, user_id)
+    if db_user is None:
+        return None
+    old_username: str = db_user.username  # type: ignore
+    update_data = user_update.model_dump(exclude_unset=True)
+    if "password" in update_data:
+        update_data["hashed_password"] = await utils.hash_password_async(update_data["password"])
+        del update_data["password"]
+    for key, value in update_data.items():
+        setattr(db_user, key, value)
+    await db.commit()
+    await db.refresh(db_user)
+    await user_cache.ainvalidate(old_username)
+    if db_user.username != old_username:
+        await user_cache.ainvalidate(db_user.username)  # type: ignore
+    return db_user
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> models.User | None:
+    user = await get_user_by_username(db, username)
+    if user and await utils.verify_password_async(password, str(user.hashed_password)):
+        return user
+    return None
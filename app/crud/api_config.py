@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
 import logging
 from typing import List
-from sqlalchemy import func, select, insert, update, delete
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.orm import Session
 from app import schemas, models
 from app.core import utils
 from app.core.database import SessionLocal
+from app.service.api_config_registry import api_config_registry
 
 
 def create_api_config_doubao_glm(
@@ -15,6 +16,7 @@ def create_api_config_doubao_glm(
     db.add(db_api_config)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
 
 
@@ -25,6 +27,7 @@ def create_api_config_xunfei_ai_ppt(
     db.add(db_api_config)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
 
 
@@ -45,15 +48,6 @@ def get_api_config_doubao_glm_by_page(db: Session, page: int = 1, per_page: int
     )
 
 
-def random_get_enabled_api_config_doubao_glm(db: Session):
-    return (
-        db.query(models.ApiConfigDouBaoGLM)
-        .filter(models.ApiConfigDouBaoGLM.enabled == True)
-        .order_by(func.random())
-        .first()
-    )
-
-
 def get_api_config_xunfei_ai_ppt(db: Session, api_config_id: int):
     return (
         db.query(models.ApiConfigXunFeiAiPPT)
@@ -73,15 +67,6 @@ def get_api_config_xunfei_ai_ppt_by_page(
     )
 
 
-def random_get_enabled_api_config_xunfei_ai_ppt(db: Session):
-    return (
-        db.query(models.ApiConfigXunFeiAiPPT)
-        .filter(models.ApiConfigXunFeiAiPPT.enabled == True)
-        .order_by(func.random())
-        .first()
-    )
-
-
 def update_api_config_doubao_glm(
     db: Session, api_config_id: int, api_config: schemas.ApiConfigDouBaoGLMUpdate
 ):
@@ -97,6 +82,7 @@ def update_api_config_doubao_glm(
         setattr(db_api_config, key, value)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
 
 
@@ -115,6 +101,7 @@ def update_api_config_xunfei_ai_ppt(
         setattr(db_api_config, key, value)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
 
 
@@ -145,18 +132,6 @@ def get_api_config_bytedance_openspeech_by_page(
     )
 
 
-def random_get_enabled_api_config_bytedance_openspeech(db: Session):
-    return (
-        db.execute(
-            select(models.ApiConfigBytedanceOpenspeech)
-            .where(models.ApiConfigBytedanceOpenspeech.enabled == True)
-            .order_by(func.random())
-        )
-        .scalars()
-        .first()
-    )
-
-
 def create_api_config_bytedance_openspeech(
     db: Session, api_config: schemas.ApiConfigByteDanceOpenspeechCreate
 ):
@@ -165,6 +140,7 @@ def create_api_config_bytedance_openspeech(
     db.add(db_api_config)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
 
 
@@ -185,4 +161,5 @@ def update_api_config_bytedance_openspeech(
         setattr(db_api_config, key, value)
     db.commit()
     db.refresh(db_api_config)
+    api_config_registry.invalidate()
     return db_api_config
@@ -5,7 +5,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import delete, select, insert, update
 from app import schemas, models
 from app.core import utils
+from app.core.config import CONFIG
 from app.core.database import SessionLocal
+from app.service.user_cache import user_cache
 
 
 def get_user(db: Session, user_id: int) -> models.User | None:
@@ -24,8 +26,31 @@ def get_users(db: Session, skip: int = 0, limit: int = 10) -> List[models.User]
     return db.query(models.User).offset(skip).limit(limit).all()
 
 
+def get_user_ids_after(db: Session, after_id: int, limit: int) -> List[int]:
+    return list(
+        db.execute(
+            select(models.User.id)
+            .where(models.User.id > after_id)
+            .order_by(models.User.id)
+            .limit(limit)
+        ).scalars()
+    )
+
+
 def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = utils.hash_password(user.password)
+    return _create_user(db, user, utils.hash_password(user.password))
+
+
+def create_device_user(db: Session, user: schemas.UserCreate):
+    """
+    创建以设备 id 作为密码的设备用户;开启设备凭证时密码存为 HMAC,不计算 bcrypt
+    """
+    if not CONFIG.AUTH.DEVICE_CREDENTIAL_ENABLED:
+        return create_user(db, user)
+    return _create_user(db, user, utils.hash_device_credential(user.password))
+
+
+def _create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -45,6 +70,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
         return None
+    old_username: str = db_user.username  # type: ignore
     update_data = user_update.model_dump(exclude_unset=True)
     if "password" in update_data:
         update_data["hashed_password"] = utils.hash_password(update_data["password"])
@@ -53,6 +79,9 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         setattr(db_user, key, value)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(old_username)
+    if db_user.username != old_username:
+        user_cache.invalidate(db_user.username)  # type: ignore
     return db_user
 
 
@@ -62,6 +91,7 @@ def delete_user(db: Session, user_id: int):
         return None
     db.delete(db_user)
     db.commit()
+    user_cache.invalidate(db_user.username)  # type: ignore
     return db_user
 
 
@@ -74,11 +104,6 @@ def delete_user(db: Session, user_id: int):
 #     db.execute(delete_stmt)
 #     db.commit()
 #     return db_user
-def authenticate_user(db: Session, username: str, password: str) -> models.User | None:
-    user = get_user_by_username(db, username)
-    if user and utils.verify_password(password, str(user.hashed_password)):
-        return user
-    return None
 
 
 def init_user():
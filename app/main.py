@@ -7,20 +7,36 @@ from pydantic import ValidationError
 from app.core.config import CONFIG
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import auth, user, cdkey, errors, speech, chat, api_config, aippt
+from app.api import auth, user, cdkey, errors, speech, chat, api_config, aippt, metrics, usage
 from app.crud.user import init_user
 from app.core.log import logging
 from app.schemas.errors import ErrorCode, ErrorDetail
+from app.core.password_hasher import PasswordHasherBusy
 from app.scheduler.service import init_scheduler, scheduler
+from app.service.doubao_glm import glm_registry
+from app.service.api_config_registry import api_config_registry
+from app.core.redis_client import redis_subscriber
+from app.service.glm_token import tokenizer_registry
+from app.service.chat_message_writer import chat_message_writer
+from app.service.usage_accounting import usage_accumulator
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_user()
+    tokenizer_registry.warm_up()
+    api_config_registry.refresh()
+    redis_subscriber.start()
+    if CONFIG.CHAT.WRITE_BEHIND_ENABLED:
+        chat_message_writer.start()
     scheduler.start()
     init_scheduler()
     yield
     scheduler.shutdown()
+    chat_message_writer.stop()
+    redis_subscriber.stop()
+    usage_accumulator.flush()
+    await glm_registry.close()
 
 
 app = FastAPI(
@@ -52,8 +68,18 @@ app.include_router(aippt.router, prefix="/api")
 
 
 app.include_router(api_config.router, prefix="/api/backend")
+app.include_router(metrics.router, prefix="/api/backend")
+app.include_router(usage.router, prefix="/api/backend")
 
 
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": ErrorDetail.from_error_code(ErrorCode.AUTH_BUSY)},
+    )
@@ -4,5 +4,6 @@ from .cdkey import *
 from .api_config import *
 from .ai_chat_message import *
 from .aippt import *
+from .ai_usage import *
 
 Base.metadata.create_all(bind=engine)
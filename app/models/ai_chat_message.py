@@ -1,11 +1,45 @@
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Enum, JSON,ForeignKey,Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Enum, JSON,ForeignKey,Text,Index
+from app.core.compression import CompressedText
 from app.core.database import Base
 from .user import User
 
 class AiChatMessage(Base):
     __tablename__ = "ai_chat_messages"
+    # 历史按 user_id 过滤、按 id 倒序做 keyset 分页
+    __table_args__ = (Index("ix_ai_chat_messages_user_id_id", "user_id", "id"),)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # 按用户查询由 (user_id, id) 联合索引覆盖,不再单独建 user_id 索引
+    user_id = Column(Integer,ForeignKey(User.id), nullable=False,)
+    role = Column(String(20), nullable=False)
+    content = Column(CompressedText, nullable=False)
+    token_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class AiChatSummary(Base):
+    """
+    压缩后的历史摘要,覆盖该用户 id <= up_to_message_id 的全部消息
+    """
+    __tablename__ = "ai_chat_summaries"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer,ForeignKey(User.id),index=True, nullable=False,)
+    up_to_message_id = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class AiChatMessageArchive(Base):
+    """
+    从 ai_chat_messages 归档出来的冷数据,保留原 id;content 原样搬运,仍是压缩格式
+    """
+    __tablename__ = "ai_chat_messages_archive"
+    __table_args__ = (Index("ix_ai_chat_messages_archive_user_id_id", "user_id", "id"),)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
     role = Column(String(20), nullable=False)
-    content = Column(Text, nullable=False)
\ No newline at end of file
+    content = Column(CompressedText, nullable=False)
+    token_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, server_default=func.now())
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, func, UniqueConstraint
+from app.core.database import Base
+
+
+class AiUsageRollup(Base):
+    """
+    按 (用户, key, 模型, 小时) 汇总的 token 用量,user_id 为 0 表示后台任务产生的用量
+    """
+    __tablename__ = "ai_usage_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "api_config_id", "model", "hour", name="uq_ai_usage_rollup"),
+    )
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    api_config_id = Column(Integer, nullable=False)
+    model = Column(String(255), nullable=False)
+    hour = Column(DateTime, nullable=False, index=True)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
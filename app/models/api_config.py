@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Enum, JSON
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, func, Enum, JSON
 from app.core.database import Base
 
 
@@ -10,6 +10,12 @@ class ApiConfigDouBaoGLM(Base):
     api_key = Column(String(255), nullable=False)
     model = Column(String(255), nullable=False)
     enabled = Column(Boolean, default=True)
+    # 该 key 在服务商处的并发和 QPS 上限,为空时使用配置文件中的默认值
+    max_concurrency = Column(Integer, nullable=True)
+    max_qps = Column(Float, nullable=True)
+    # 路由标签,如 "fast"、"long-context";max_context 为该模型的上下文长度(输入加输出的 token 数)
+    tags = Column(JSON, nullable=True)
+    max_context = Column(Integer, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
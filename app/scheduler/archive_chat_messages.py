@@ -0,0 +1,56 @@
+import logging
+from datetime import datetime, timedelta
+from app import crud
+from app.core.config import CONFIG
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client
+
+# 按用户归档时已检查到的用户 id,一轮结束后归零
+ARCHIVE_USER_CURSOR_KEY = "chat:archive:user_cursor"
+
+
+def archive_chat_messages():
+    """
+    分批把过期或超出每用户保留条数的消息移入归档表,每批一个短事务
+    """
+    db = SessionLocal()
+    try:
+        batches = CONFIG.STORAGE.RETENTION_MAX_BATCHES_PER_RUN
+        archived = 0
+        if CONFIG.STORAGE.RETENTION_MAX_AGE_DAYS > 0:
+            before = datetime.now() - timedelta(days=CONFIG.STORAGE.RETENTION_MAX_AGE_DAYS)
+            while batches > 0:
+                message_ids = crud.get_expired_ai_chat_message_ids(db, before, CONFIG.STORAGE.RETENTION_BATCH_SIZE)
+                if not message_ids:
+                    break
+                archived += crud.archive_ai_chat_messages(db, message_ids)
+                batches -= 1
+        if CONFIG.STORAGE.RETENTION_KEEP_PER_USER > 0 and batches > 0:
+            archived += archive_beyond_latest(db, batches)
+        if archived:
+            logging.info(f"Archived {archived} chat messages")
+    except Exception as e:
+        logging.error(f"archive chat messages error:{e}")
+    finally:
+        db.close()
+
+
+def archive_beyond_latest(db, batches: int) -> int:
+    after_user_id = int(redis_client.client.get(ARCHIVE_USER_CURSOR_KEY) or 0)  # type: ignore
+    user_ids = crud.get_user_ids_after(db, after_user_id, CONFIG.STORAGE.RETENTION_USERS_PER_RUN)
+    archived = 0
+    for user_id in user_ids:
+        while batches > 0:
+            message_ids = crud.get_ai_chat_message_ids_beyond_latest(
+                db, user_id, CONFIG.STORAGE.RETENTION_KEEP_PER_USER, CONFIG.STORAGE.RETENTION_BATCH_SIZE
+            )
+            if not message_ids:
+                break
+            archived += crud.archive_ai_chat_messages(db, message_ids)
+            batches -= 1
+        if batches == 0:
+            # 本用户可能还没处理完,下次从该用户继续
+            redis_client.client.set(ARCHIVE_USER_CURSOR_KEY, user_id - 1)
+            return archived
+    redis_client.client.set(ARCHIVE_USER_CURSOR_KEY, user_ids[-1] if user_ids else 0)
+    return archived
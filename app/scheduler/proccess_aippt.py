@@ -1,13 +1,14 @@
 import logging
-from app import schemas
+from app import models, schemas
 from app.core.database import SessionLocal
-from app.crud import aippt, api_config
+from app.crud import aippt
+from app.service.api_config_registry import api_config_registry
 from app.service.xunfei_aippt import XunFeiAiPPTClient
 def proccess_aippt():
     try:
         db = SessionLocal()
 
-        config = api_config.random_get_enabled_api_config_xunfei_ai_ppt(db)
+        config = api_config_registry.random_get_enabled(models.ApiConfigXunFeiAiPPT)
         if config is None:
             logging.info("No enabled api config")
             return
@@ -0,0 +1,23 @@
+import logging
+from app import crud
+from app.core.config import CONFIG
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client
+
+# 已处理到的消息 id,保存在 Redis 中以便重启和多个 worker 之间接续
+RECOMPRESS_CURSOR_KEY = "chat:recompress:cursor"
+
+
+def recompress_chat_messages():
+    db = SessionLocal()
+    try:
+        after_id = int(redis_client.client.get(RECOMPRESS_CURSOR_KEY) or 0)  # type: ignore
+        last_id, compressed = crud.recompress_ai_chat_messages(db, after_id, CONFIG.STORAGE.RECOMPRESS_BATCH_SIZE)
+        if last_id is None:
+            return
+        redis_client.client.set(RECOMPRESS_CURSOR_KEY, last_id)
+        logging.info(f"Recompressed {compressed} chat messages up to id {last_id}")
+    except Exception as e:
+        logging.error(f"recompress chat messages error:{e}")
+    finally:
+        db.close()
@@ -2,10 +2,33 @@ from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from app.scheduler.proccess_aippt import proccess_aippt
+from app.scheduler.recompress_chat_messages import recompress_chat_messages
+from app.scheduler.archive_chat_messages import archive_chat_messages
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from app.core.config import CONFIG
+from app.service.usage_accounting import usage_accumulator
+from app.service.api_config_registry import api_config_registry
 
 
 scheduler = AsyncIOScheduler()
 
 def init_scheduler():
     scheduler.add_job(proccess_aippt, IntervalTrigger(seconds=20))
+    scheduler.add_job(usage_accumulator.flush, IntervalTrigger(seconds=CONFIG.UPSTREAM.USAGE_FLUSH_INTERVAL_SECONDS))
+    scheduler.add_job(
+        api_config_registry.refresh,
+        IntervalTrigger(seconds=CONFIG.UPSTREAM.API_CONFIG_REFRESH_INTERVAL_SECONDS),
+        max_instances=1,
+    )
+    if CONFIG.STORAGE.CONTENT_COMPRESSION_ENABLED and CONFIG.STORAGE.RECOMPRESS_JOB_ENABLED:
+        scheduler.add_job(
+            recompress_chat_messages,
+            IntervalTrigger(seconds=CONFIG.STORAGE.RECOMPRESS_INTERVAL_SECONDS),
+            max_instances=1,
+        )
+    if CONFIG.STORAGE.RETENTION_ENABLED:
+        scheduler.add_job(
+            archive_chat_messages,
+            IntervalTrigger(seconds=CONFIG.STORAGE.RETENTION_INTERVAL_SECONDS),
+            max_instances=1,
+        )
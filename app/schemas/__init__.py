@@ -3,4 +3,5 @@ from .cdkey import *
 from .errors import *
 from .api_config import *
 from .ai_chat_message import *
-from .aippt import *
\ No newline at end of file
+from .aippt import *
+from .ai_usage import *
\ No newline at end of file
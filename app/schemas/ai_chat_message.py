@@ -1,4 +1,5 @@
 import enum
+from datetime import datetime
 from typing import List, Literal, TypedDict
 from pydantic import BaseModel
 
@@ -9,6 +10,8 @@ class AiChatMessage(BaseModel):
     user_id: int
     role: str
     content: str
+    token_count: int | None = None
+    created_at: datetime | None = None
 
 
     class Config:
@@ -18,4 +21,18 @@ class AiChatMessageCreate(BaseModel):
     user_id: int
     role: str
     content: str
+    token_count: int | None = None
 
+
+
+class AiChatSummaryCreate(BaseModel):
+    user_id: int
+    up_to_message_id: int
+    content: str
+    token_count: int
+
+
+class AiChatMessagePage(BaseModel):
+    messages: List[AiChatMessage]
+    # 下一页请求的 before_id,没有更多数据时为空
+    next_before_id: int | None = None
@@ -0,0 +1,27 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class AiUsageRollup(BaseModel):
+    user_id: int
+    api_config_id: int
+    model: str
+    hour: datetime
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+    class Config:
+        from_attributes = True
+
+
+class AiUsageRollupCreate(BaseModel):
+    user_id: int
+    api_config_id: int
+    model: str
+    hour: datetime
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import List
 from pydantic import BaseModel
 
 
@@ -7,6 +8,10 @@ class ApiConfigDouBaoGLMCreate(BaseModel):
     name: str
     api_key: str
     model: str
+    max_concurrency: int | None = None
+    max_qps: float | None = None
+    tags: List[str] | None = None
+    max_context: int | None = None
 
 
 class ApiConfigDouBaoGLMUpdate(BaseModel):
@@ -14,6 +19,10 @@ class ApiConfigDouBaoGLMUpdate(BaseModel):
     api_key: str | None = None
     model: str | None = None
     enabled: bool | None = None
+    max_concurrency: int | None = None
+    max_qps: float | None = None
+    tags: List[str] | None = None
+    max_context: int | None = None
 
 
 class ApiConfigDouBaoGLM(BaseModel):
@@ -22,6 +31,10 @@ class ApiConfigDouBaoGLM(BaseModel):
     api_key: str
     model: str
     enabled: bool
+    max_concurrency: int | None = None
+    max_qps: float | None = None
+    tags: List[str] | None = None
+    max_context: int | None = None
     created_at: datetime
     updated_at: datetime
 
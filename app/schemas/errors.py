@@ -22,6 +22,7 @@ class ErrorCode(Enum):
     IS_EXPIRED = (1012, "使用权限已过期")
     NOT_AUTHENTICATED = (1013, "未认证")
     INVALID_CREDENTIALS = (1014, "无效的凭据")
+    AUTH_BUSY = (1015, "登录请求过多,请稍后再试")
 
     CDKEY_NOT_FOUND = (2001, "CDKEY不存在")
     CDKEY_USED = (2002, "CDKEY已使用")
@@ -32,6 +33,7 @@ class ErrorCode(Enum):
     SPEECH_INVALID_FILE = (3003, "语音文件无效,请上传MP3格式的音频文件")
 
     API_CONFIG_NOT_FOUND = (4001, "API配置不存在")
+    UPSTREAM_BUSY = (4002, "服务繁忙,请稍后再试")
 
     AI_PPT_TASK_NOT_FOUND = (5001, "AI PPT任务不存在")
     def __init__(self, code, message):
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, List
+from app import models
+from app.core.config import CONFIG
+
+
+class AdmissionError(Exception):
+    """
+    排队已满或排队超时,请求未被发往上游
+    """
+
+
+class KeyLimiter:
+    """
+    单个 key 的并发上限和令牌桶,超出的请求按用户轮转排队
+
+    同一用户的请求在自己的队列里先进先出,放行时在各用户之间轮转,单个用户的大量请求不会饿死其他用户
+    """
+
+    def __init__(self, max_concurrency: int, max_qps: float, max_queue_size: int):
+        self.max_concurrency = max_concurrency
+        self.max_qps = max_qps
+        self.max_queue_size = max_queue_size
+        self.active = 0
+        self.tokens = max(max_qps, 1.0)
+        self.updated_at = time.monotonic()
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self.queued = 0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def configure(self, max_concurrency: int, max_qps: float):
+        self.max_concurrency = max_concurrency
+        self.max_qps = max_qps
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated_at) * self.max_qps, max(self.max_qps, 1.0))
+        self.updated_at = now
+
+    def _can_admit(self) -> bool:
+        self._refill()
+        return self.active < self.max_concurrency and self.tokens >= 1
+
+    def _admit(self):
+        self.active += 1
+        self.tokens -= 1
+
+    async def acquire(self, user_id: Hashable, timeout: float):
+        if not self._queues and self._can_admit():
+            self._admit()
+            return
+        if self.queued >= self.max_queue_size:
+            raise AdmissionError("admission queue is full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        # 没有进行中的请求时不会有 release 触发调度,这里立即调度一次,令牌不足时由它设置补充令牌的定时器
+        self._dispatch()
+        try:
+            await asyncio.wait([waiter], timeout=timeout)
+        except BaseException:
+            self._abandon(user_id, waiter)
+            raise
+        if not waiter.done():
+            self._abandon(user_id, waiter)
+            raise AdmissionError("admission queue timeout")
+
+    def _abandon(self, user_id: Hashable, waiter: asyncio.Future):
+        # 已被放行但等待方放弃时归还名额
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+            return
+        waiter.cancel()
+        if (queue := self._queues.get(user_id)) is not None and waiter in queue:
+            queue.remove(waiter)
+            self.queued -= 1
+            if not queue:
+                del self._queues[user_id]
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queues and self._can_admit():
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if waiter.done():
+                continue
+            self._admit()
+            waiter.set_result(None)
+        # 因令牌不足而无法放行时,等到下一个令牌生成再调度
+        if self._queues and self.active < self.max_concurrency and self._timer is None:
+            delay = (1 - self.tokens) / self.max_qps if self.max_qps > 0 else 1.0
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_qps": self.max_qps,
+        }
+
+
+class AdmissionController:
+    """
+    为每个 ApiConfigDouBaoGLM 维护一个 KeyLimiter,限制发往上游的并发和 QPS
+    """
+
+    def __init__(
+        self,
+        default_max_concurrency: int,
+        default_max_qps: float,
+        max_queue_size: int,
+        queue_timeout: float,
+    ):
+        self.default_max_concurrency = default_max_concurrency
+        self.default_max_qps = default_max_qps
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self._limiters: Dict[int, KeyLimiter] = {}
+        self.rejected = 0
+
+    def _get_limiter(self, config: models.ApiConfigDouBaoGLM) -> KeyLimiter:
+        max_concurrency: int = config.max_concurrency or self.default_max_concurrency  # type: ignore
+        max_qps: float = config.max_qps or self.default_max_qps  # type: ignore
+        limiter = self._limiters.get(config.id)  # type: ignore
+        if limiter is None:
+            limiter = KeyLimiter(max_concurrency, max_qps, self.max_queue_size)
+            self._limiters[config.id] = limiter  # type: ignore
+        elif limiter.max_concurrency != max_concurrency or limiter.max_qps != max_qps:
+            limiter.configure(max_concurrency, max_qps)
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, config: models.ApiConfigDouBaoGLM, user_id: Hashable) -> AsyncIterator[None]:
+        limiter = self._get_limiter(config)
+        try:
+            await limiter.acquire(user_id, self.queue_timeout)
+        except AdmissionError:
+            self.rejected += 1
+            raise
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        keys: List[Dict[str, Any]] = [
+            {"api_config_id": config_id, **limiter.stats()}
+            for config_id, limiter in sorted(self._limiters.items())
+        ]
+        return {"rejected": self.rejected, "keys": keys}
+
+
+admission_controller = AdmissionController(
+    default_max_concurrency=CONFIG.UPSTREAM.ADMISSION_DEFAULT_MAX_CONCURRENCY,
+    default_max_qps=CONFIG.UPSTREAM.ADMISSION_DEFAULT_MAX_QPS,
+    max_queue_size=CONFIG.UPSTREAM.ADMISSION_MAX_QUEUE_SIZE,
+    queue_timeout=CONFIG.UPSTREAM.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
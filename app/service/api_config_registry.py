@@ -0,0 +1,103 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Type, TypeVar
+import redis
+from app import models
+from app.core.config import CONFIG
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client, redis_subscriber
+
+ApiConfigModel = TypeVar(
+    "ApiConfigModel",
+    models.ApiConfigDouBaoGLM,
+    models.ApiConfigXunFeiAiPPT,
+    models.ApiConfigBytedanceOpenspeech,
+)
+
+API_CONFIG_MODELS = (
+    models.ApiConfigDouBaoGLM,
+    models.ApiConfigXunFeiAiPPT,
+    models.ApiConfigBytedanceOpenspeech,
+)
+
+
+class ApiConfigRegistry:
+    """
+    进程内缓存三张 api_config 表中启用的配置,请求选取凭证时不再查库
+
+    配置增改后由 crud 调用 invalidate:本进程立即重新加载,并通过 Redis 频道通知其他进程;
+    各进程经 redis_subscriber 订阅该频道,定时任务再定期全量刷新,以防通知丢失
+    """
+
+    def __init__(self, client: redis.Redis, channel: str):
+        self.client = client
+        self.channel = channel
+        self._configs: Dict[type, List] = {}
+        self._loaded_at = 0.0
+        self._refreshes = 0
+        self._lock = threading.Lock()
+
+    def get_enabled(self, model: Type[ApiConfigModel]) -> List[ApiConfigModel]:
+        """
+        返回某张表中启用的配置,按 id 排序;尚未加载时同步加载一次
+        """
+        if not self._loaded_at:
+            self.refresh()
+        return self._configs.get(model, [])
+
+    def random_get_enabled(self, model: Type[ApiConfigModel]) -> ApiConfigModel | None:
+        configs = self.get_enabled(model)
+        return random.choice(configs) if configs else None
+
+    def refresh(self):
+        """
+        重新加载所有启用的配置;加载完成后整体替换,读取方不会看到加载到一半的结果
+        """
+        with self._lock:
+            db = SessionLocal()
+            try:
+                configs = {
+                    model: db.query(model).filter(model.enabled == True).order_by(model.id).all()
+                    for model in API_CONFIG_MODELS
+                }
+            except Exception as e:
+                logging.error(f"load api configs error:{e}")
+                return
+            finally:
+                # 关闭会话后对象与会话分离,已加载的属性仍可在各线程中只读访问
+                db.close()
+            self._configs = configs
+            self._loaded_at = time.time()
+            self._refreshes += 1
+
+    def invalidate(self):
+        """
+        配置变更后调用,重新加载本进程的缓存并通知其他进程
+        """
+        self.refresh()
+        try:
+            self.client.publish(self.channel, "1")
+        except Exception as e:
+            logging.error(f"publish api config invalidation error:{e}")
+
+    def stats(self) -> dict:
+        return {
+            "configs": {model.__tablename__: len(configs) for model, configs in self._configs.items()},
+            "loaded_at": self._loaded_at,
+            "refreshes": self._refreshes,
+        }
+
+
+api_config_registry = ApiConfigRegistry(
+    redis_client.client,
+    channel=CONFIG.UPSTREAM.API_CONFIG_INVALIDATE_CHANNEL,
+)
+
+# 订阅(或断线重连)期间可能错过通知,订阅成功后先刷新一次
+redis_subscriber.subscribe(
+    api_config_registry.channel,
+    lambda _: api_config_registry.refresh(),
+    on_connect=api_config_registry.refresh,
+)
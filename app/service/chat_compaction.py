@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from typing import Dict, List, Protocol, Set
+from fastapi.concurrency import run_in_threadpool
+from app import crud, models, schemas
+from app.core.config import CONFIG
+from app.core.database import SessionLocal
+from app.service import chat_history
+from app.service import glm_balancer, glm_token
+from app.service.api_config_registry import api_config_registry
+from app.service.model_router import model_router
+
+
+class Summarizer(Protocol):
+    async def summarize(self, previous_summary: str | None, messages: List[Dict[str, str]]) -> str: ...
+
+
+class DouBaoSummarizer:
+    """
+    调用豆包生成摘要
+    """
+
+    PROMPT = (
+        "请把下面的对话压缩成一段简洁的摘要,保留用户的身份信息、偏好、约定和尚未完成的事项,"
+        "省略寒暄,不超过500字。直接输出摘要内容。"
+    )
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+
+    async def summarize(self, previous_summary: str | None, messages: List[Dict[str, str]]) -> str:
+        lines = []
+        if previous_summary:
+            lines.append(f"此前的摘要: {previous_summary}")
+        lines.extend(f"{message['role']}: {message['content']}" for message in messages)
+        prompt = [
+            {"role": "system", "content": self.PROMPT},
+            {"role": "user", "content": "\n".join(lines)},
+        ]
+        configs = api_config_registry.get_enabled(models.ApiConfigDouBaoGLM)
+        if not configs:
+            raise RuntimeError("No enabled doubao api config")
+        route = model_router.route(configs, glm_token.num_tokens_from_messages(prompt), self.max_tokens)
+        config = glm_balancer.glm_balancer.choose(route.configs)
+        completion = await glm_balancer.chat(config, prompt, max_tokens=route.max_tokens)  # type: ignore
+        if not (content := completion.choices[0].message.content):
+            raise RuntimeError("Empty summary")
+        return content
+
+
+
+class StubSummarizer:
+    """
+    本地摘要,不请求上游,只截取每条消息的开头;用于测试和调试
+    """
+
+    def __init__(self, chars_per_message: int = 20):
+        self.chars_per_message = chars_per_message
+
+    async def summarize(self, previous_summary: str | None, messages: List[Dict[str, str]]) -> str:
+        lines = [previous_summary] if previous_summary else []
+        lines.extend(
+            f"{message['role']}: {message['content'][: self.chars_per_message]}" for message in messages
+        )
+        return "\n".join(lines)
+
+
+class ChatCompactor:
+    """
+    历史超过阈值的用户,把较早的对话压缩进一条摘要;之后的对话从摘要开始读取
+    """
+
+    def __init__(self, summarizer: Summarizer, threshold_tokens: int, keep_recent_tokens: int):
+        self.summarizer = summarizer
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self._running: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, user_id: int, history: List[chat_history.HistoryMessage]):
+        """
+        history 为本轮使用的历史,超过阈值时在后台压缩,同一用户同时只跑一个任务
+        """
+        if sum(message["token_count"] for message in history) < self.threshold_tokens:
+            return
+        if user_id in self._running:
+            return
+        self._running.add(user_id)
+        task = asyncio.create_task(self._compact(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, user_id: int):
+        try:
+            await self.compact(user_id)
+        except Exception as e:
+            logging.error(f"compact chat history of user {user_id} error:{e}")
+        finally:
+            self._running.discard(user_id)
+
+    async def compact(self, user_id: int) -> bool:
+        """
+        立即压缩一个用户的历史,没有可压缩的消息时返回 False
+        """
+        previous_summary, to_summarize = await run_in_threadpool(self._collect, user_id)
+        if not to_summarize:
+            return False
+        summary = await self.summarizer.summarize(
+            previous_summary,
+            [{"role": message.role, "content": message.content} for message in to_summarize],  # type: ignore
+        )
+        summary_message = chat_history.new_summary_message(summary)
+        await run_in_threadpool(
+            self._save,
+            schemas.AiChatSummaryCreate(
+                user_id=user_id,
+                up_to_message_id=to_summarize[-1].id,  # type: ignore
+                content=summary,
+                token_count=summary_message["token_count"],
+            ),
+        )
+        # 缓存中仍是压缩前的窗口,删除后下次从摘要重新加载
+        if CONFIG.CHAT.HISTORY_CACHE_ENABLED:
+            await chat_history.chat_history_cache.delete(user_id)
+        logging.info(f"Compacted {len(to_summarize)} chat messages of user {user_id}")
+        return True
+
+    def _collect(self, user_id: int):
+        """
+        返回上一条摘要和需要压缩的消息(从旧到新),最近 keep_recent_tokens 内的消息保留原文
+        """
+        db = SessionLocal()
+        try:
+            summary = crud.get_latest_ai_chat_summary(db, user_id)
+            after_id = summary.up_to_message_id if summary else None
+            kept_tokens = 0
+            to_summarize = []
+            for chat_message, tokens in chat_history.iter_recent_messages(
+                db, user_id, CONFIG.CHAT.HISTORY_MAX_TOKENS, after_id  # type: ignore
+            ):
+                if kept_tokens + tokens <= self.keep_recent_tokens and not to_summarize:
+                    kept_tokens += tokens
+                    continue
+                to_summarize.append(chat_message)
+            to_summarize.reverse()
+            return (summary.content if summary else None), to_summarize
+        finally:
+            db.close()
+
+    def _save(self, new_summary: schemas.AiChatSummaryCreate):
+        db = SessionLocal()
+        try:
+            crud.create_ai_chat_summary(db, new_summary)
+        finally:
+            db.close()
+
+
+SUMMARIZERS = {
+    "doubao": lambda: DouBaoSummarizer(CONFIG.CHAT.COMPACTION_SUMMARY_MAX_TOKENS),
+    "stub": StubSummarizer,
+}
+
+chat_compactor = ChatCompactor(
+    SUMMARIZERS[CONFIG.CHAT.COMPACTION_SUMMARIZER](),
+    threshold_tokens=CONFIG.CHAT.COMPACTION_THRESHOLD_TOKENS,
+    keep_recent_tokens=CONFIG.CHAT.COMPACTION_KEEP_RECENT_TOKENS,
+)
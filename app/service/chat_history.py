@@ -0,0 +1,244 @@
+import json
+import logging
+from typing import Dict, Iterator, List, Tuple, TypedDict
+from fastapi.concurrency import run_in_threadpool
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import crud, models, schemas
+from app.core.config import CONFIG
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import async_redis_client
+from app.service import glm_token
+from app.service.chat_message_writer import chat_message_writer
+
+# 每次从数据库取的历史条数,大多数对话一页即可填满预算
+HISTORY_PAGE_SIZE = 100
+SUMMARY_PREFIX = "以下是此前对话的摘要:\n"
+
+
+class HistoryMessage(TypedDict):
+    role: str
+    content: str
+    token_count: int
+
+
+def new_history_message(role: str, content: str) -> HistoryMessage:
+    return {
+        "role": role,
+        "content": content,
+        "token_count": glm_token.num_tokens_from_message({"role": role, "content": content}),
+    }
+
+
+def new_summary_message(summary: str) -> HistoryMessage:
+    return new_history_message("system", SUMMARY_PREFIX + summary)
+
+
+def iter_recent_messages(
+    db: Session,
+    user_id: int,
+    max_tokens: int,
+    after_id: int | None = None,
+    page_size: int = HISTORY_PAGE_SIZE,
+) -> Iterator[Tuple[models.AiChatMessage, int]]:
+    """
+    从新到旧分页读取 id > after_id 的历史消息,按 token 预算逐条累加,依次返回消息及其 token 数
+    """
+    budget = max_tokens
+    before_id = None
+    while budget > 0:
+        page = crud.get_ai_chat_messages_by_user_id(db, user_id, page_size, before_id, after_id)
+        for chat_message in page:
+            tokens = chat_message.token_count  # type: ignore
+            if tokens is None:
+                tokens = glm_token.num_tokens_from_message(
+                    {"role": chat_message.role, "content": chat_message.content}
+                )
+            if tokens > budget:
+                return
+            budget -= tokens
+            yield chat_message, tokens  # type: ignore
+        if len(page) < page_size:
+            return
+        before_id = page[-1].id
+
+
+def load_history(
+    db: Session,
+    user_id: int,
+    max_tokens: int,
+    page_size: int = HISTORY_PAGE_SIZE,
+) -> List[HistoryMessage]:
+    """
+    读取最近的摘要及其之后的历史消息,返回从旧到新的列表,摘要作为第一条系统消息
+    """
+    history: List[HistoryMessage] = []
+    after_id = None
+    if summary := crud.get_latest_ai_chat_summary(db, user_id):
+        after_id = summary.up_to_message_id
+        max_tokens -= summary.token_count  # type: ignore
+    for chat_message, tokens in iter_recent_messages(db, user_id, max_tokens, after_id, page_size):  # type: ignore
+        history.append({"role": chat_message.role, "content": chat_message.content, "token_count": tokens})  # type: ignore
+    if summary is not None and max_tokens >= 0:
+        history.append({"role": "system", "content": SUMMARY_PREFIX + summary.content, "token_count": summary.token_count})  # type: ignore
+    history.reverse()
+    return history
+
+
+def fit_history(history: List[HistoryMessage], max_tokens: int) -> List[HistoryMessage]:
+    """
+    从最新的消息往前取,直到超出 token 预算
+    """
+    budget = max_tokens
+    start = len(history)
+    while start > 0 and history[start - 1]["token_count"] <= budget:
+        budget -= history[start - 1]["token_count"]
+        start -= 1
+    return history[start:]
+
+
+def build_messages(
+    system_message: Dict[str, str],
+    history: List[HistoryMessage],
+    user_message: Dict[str, str],
+) -> List[Dict[str, str]]:
+    return (
+        [system_message]
+        + [{"role": message["role"], "content": message["content"]} for message in history]
+        + [user_message]
+    )
+
+
+class ChatHistoryCache:
+    """
+    每个用户最近对话的 Redis 环形缓冲区,list 中从旧到新存放消息,按条数和 token 总数截断
+
+    key 存在即表示缓存了该用户完整的近期窗口;没有历史的用户存一个占位元素,以便和未缓存区分
+    """
+
+    PLACEHOLDER = b""
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        max_messages: int,
+        max_tokens: int,
+        ttl_seconds: int,
+    ):
+        self.client = client
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, user_id: int) -> str:
+        return f"chat:history:{user_id}"
+
+    async def get(self, user_id: int) -> List[HistoryMessage] | None:
+        items = await self.client.lrange(self._key(user_id), 0, -1)  # type: ignore
+        if not items:
+            return None
+        return [json.loads(item) for item in items if item != self.PLACEHOLDER]
+
+    async def fill(self, user_id: int, history: List[HistoryMessage]):
+        key = self._key(user_id)
+        history = fit_history(history[-self.max_messages :], self.max_tokens)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.rpush(key, self.PLACEHOLDER, *[self._dumps(message) for message in history])
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def append(self, user_id: int, messages: List[HistoryMessage]):
+        """
+        追加消息,仅在缓存已存在时生效;未缓存的用户下次读取时会从数据库加载
+        """
+        key = self._key(user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, *[self._dumps(message) for message in messages])
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.lrange(key, 0, -1)
+            *_, items = await pipe.execute()
+        # 超出 token 总数时从最旧的一端截断
+        history = [json.loads(item) for item in items if item != self.PLACEHOLDER]
+        keep = len(fit_history(history, self.max_tokens))
+        if keep == len(history):
+            return
+        if keep == 0:
+            await self.fill(user_id, [])
+        else:
+            await self.client.ltrim(key, -keep, -1)
+
+    async def delete(self, user_id: int):
+        await self.client.delete(self._key(user_id))
+
+    def _dumps(self, message: HistoryMessage) -> str:
+        return json.dumps(message, ensure_ascii=False)
+
+
+chat_history_cache = ChatHistoryCache(
+    async_redis_client,
+    max_messages=CONFIG.CHAT.HISTORY_CACHE_MAX_MESSAGES,
+    max_tokens=CONFIG.CHAT.HISTORY_CACHE_MAX_TOKENS,
+    ttl_seconds=CONFIG.CHAT.HISTORY_CACHE_TTL_SECONDS,
+)
+
+
+async def get_history(db: AsyncSession, user_id: int) -> List[HistoryMessage]:
+    """
+    读取用户的近期历史,优先命中 Redis,未命中时从数据库加载并回填缓存
+    """
+    if CONFIG.CHAT.HISTORY_CACHE_ENABLED:
+        try:
+            if (history := await chat_history_cache.get(user_id)) is not None:
+                return history
+        except Exception as e:
+            logging.error(f"read chat history cache error:{e}")
+    max_tokens = max(CONFIG.CHAT.HISTORY_MAX_TOKENS, CONFIG.CHAT.HISTORY_CACHE_MAX_TOKENS)
+    # 复用同步的分页逻辑,run_sync 在异步连接上执行,不占用线程池
+    history = await db.run_sync(load_history, user_id, max_tokens)
+    if CONFIG.CHAT.HISTORY_CACHE_ENABLED:
+        try:
+            await chat_history_cache.fill(user_id, history)
+        except Exception as e:
+            logging.error(f"fill chat history cache error:{e}")
+    return history
+
+
+async def save_messages(new_messages: List[schemas.AiChatMessageCreate]):
+    async with AsyncSessionLocal() as db:
+        await crud.aio.create_ai_chat_messages(db, new_messages)
+
+
+async def save_turn(user_id: int, messages: List[HistoryMessage]):
+    """
+    同时写入数据库和 Redis 缓存;开启写后队列时数据库写入由后台线程完成,
+    队列满且溢出策略为 sync 时等待队列腾出空间,仍未入队则整轮丢弃,也不写入缓存
+    """
+    new_messages = [
+        schemas.AiChatMessageCreate(
+            user_id=user_id,
+            role=message["role"],
+            content=message["content"],
+            token_count=message["token_count"],
+        )
+        for message in messages
+    ]
+    if not chat_message_writer.running:
+        await save_messages(new_messages)
+    elif chat_message_writer.put(new_messages):
+        pass
+    elif chat_message_writer.overflow_policy == "drop":
+        logging.error(f"Chat message queue is full, dropped {len(new_messages)} messages of user {user_id}")
+        return
+    elif not await run_in_threadpool(chat_message_writer.put, new_messages, chat_message_writer.put_timeout):
+        # 不能绕过队列直接写库,否则新一轮会先于该用户仍在排队的旧消息拿到 id
+        logging.error(f"Chat message queue stayed full, dropped {len(new_messages)} messages of user {user_id}")
+        return
+    # 被丢弃的一轮不写入缓存,否则缓存中的历史会包含数据库里不存在的消息
+    if CONFIG.CHAT.HISTORY_CACHE_ENABLED:
+        try:
+            await chat_history_cache.append(user_id, messages)
+        except Exception as e:
+            logging.error(f"append chat history cache error:{e}")
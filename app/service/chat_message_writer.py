@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+import time
+from typing import List
+from app import crud, schemas
+from app.core.config import CONFIG
+from app.core.database import SessionLocal
+
+
+class ChatMessageWriter:
+    """
+    聊天消息的写后(write-behind)队列,由后台线程攒批后以多行 INSERT 写库
+
+    同一轮对话的消息作为一个整体入队,单线程按入队顺序写入,保证 id 顺序与对话顺序一致
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow_policy: str,
+        put_timeout: float,
+        retry_max_seconds: float,
+        shutdown_retries: int,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.put_timeout = put_timeout
+        self.retry_max_seconds = retry_max_seconds
+        self.shutdown_retries = shutdown_retries
+        self._queue: queue.Queue[List[schemas.AiChatMessageCreate]] = queue.Queue(max_queue_size)
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """
+        停止后台线程,退出前写完队列中剩余的消息
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.error(f"Chat message writer did not finish in {timeout}s, {self._queue.qsize()} turns left")
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def put(self, messages: List[schemas.AiChatMessageCreate], timeout: float | None = None) -> bool:
+        """
+        入队一轮对话的消息;timeout 为 None 时不等待,否则最多等待 timeout 秒。
+        队列仍满时返回 False,由调用方按溢出策略处理
+        """
+        try:
+            if timeout is None:
+                self._queue.put_nowait(messages)
+            else:
+                self._queue.put(messages, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            if batch := self._next_batch():
+                self._write(batch)
+
+    def _next_batch(self) -> List[schemas.AiChatMessageCreate]:
+        try:
+            batch = list(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.extend(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[schemas.AiChatMessageCreate]):
+        """
+        写入一批消息,失败时按指数退避重试直到成功;重试期间不取下一批,保证写入顺序。
+        停止时只再重试 shutdown_retries 次,仍失败才放弃并记录日志
+        """
+        delay = min(self.flush_interval, self.retry_max_seconds)
+        failures_after_stop = 0
+        while True:
+            db = SessionLocal()
+            try:
+                # 多行 INSERT 在一个事务中提交,失败时整体回滚,重试不会重复写入
+                crud.create_ai_chat_messages(db, batch)
+                return
+            except Exception as e:
+                logging.error(f"write behind {len(batch)} chat messages error, retry in {delay:.1f}s:{e}")
+            finally:
+                db.close()
+            if self._stopping.is_set():
+                failures_after_stop += 1
+                if failures_after_stop > self.shutdown_retries:
+                    logging.error(f"Chat message writer is stopping, dropped {len(batch)} messages after retries")
+                    return
+            time.sleep(delay)
+            delay = min(delay * 2, self.retry_max_seconds)
+
+
+chat_message_writer = ChatMessageWriter(
+    max_queue_size=CONFIG.CHAT.WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=CONFIG.CHAT.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=CONFIG.CHAT.WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+    overflow_policy=CONFIG.CHAT.WRITE_BEHIND_OVERFLOW_POLICY,
+    put_timeout=CONFIG.CHAT.WRITE_BEHIND_PUT_TIMEOUT_SECONDS,
+    retry_max_seconds=CONFIG.CHAT.WRITE_BEHIND_RETRY_MAX_SECONDS,
+    shutdown_retries=CONFIG.CHAT.WRITE_BEHIND_SHUTDOWN_RETRIES,
+)
@@ -0,0 +1,70 @@
+import time
+from typing import Any, Dict
+
+
+class CircuitBreaker:
+    """
+    单个上游 key 的熔断器
+
+    closed: 正常放行,连续失败达到阈值后转为 open
+    open: 拒绝请求,经过 reset_seconds 后转为 half_open
+    half_open: 只放行少量探测请求,成功则恢复 closed,失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self.half_open_calls = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        只判断是否放行,不占用探测名额
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            return self.half_open_calls < self.half_open_max_calls
+        return False
+
+    def on_start(self) -> bool:
+        """
+        请求开始时调用,返回是否占用了 half_open 的探测名额
+        """
+        if self.state == self.HALF_OPEN:
+            self.half_open_calls += 1
+            return True
+        return False
+
+    def on_success(self):
+        self._state = self.CLOSED
+        self.failures = 0
+
+    def on_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def on_cancel(self, probe: bool):
+        # 探测请求被取消时归还名额
+        if probe and self._state == self.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures}
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Iterable, Mapping
+from redis import asyncio as aioredis
+from volcenginesdkarkruntime.types.chat import ChatCompletion
+from app.core.config import CONFIG
+from app.core.redis_client import async_redis_client
+
+
+def completion_key(model: str, messages: Iterable[Mapping[str, str]], max_tokens: int) -> str:
+    """
+    按模型、max_tokens 和规范化后的 messages 计算请求指纹,content 中的空白字符会被折叠
+    """
+    normalized = [
+        {"role": message["role"], "content": " ".join(message["content"].split())}
+        for message in messages
+    ]
+    payload = json.dumps(
+        {"model": model, "max_tokens": max_tokens, "messages": normalized},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    /chat/completion 的完全匹配缓存,存放在 Redis 中并带 TTL
+
+    所有 key 记录在一个按写入时间排序的 zset 中,超过 max_entries 时淘汰最早写入的条目
+    """
+
+    KEY_PREFIX = "chat:completion:"
+    INDEX_KEY = "chat:completion:index"
+    STATS_KEY = "chat:completion:stats"
+
+    def __init__(self, client: aioredis.Redis, ttl_seconds: int, max_entries: int, max_bytes: int):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    async def get(self, key: str) -> ChatCompletion | None:
+        data = await self.client.get(self.KEY_PREFIX + key)
+        await self.client.hincrby(self.STATS_KEY, "hits" if data else "misses", 1)  # type: ignore
+        if not data:
+            return None
+        return ChatCompletion.model_validate_json(data)
+
+    async def set(self, key: str, completion: ChatCompletion):
+        data = completion.model_dump_json()
+        if len(data) > self.max_bytes:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.KEY_PREFIX + key, data, ex=self.ttl_seconds)
+            pipe.zadd(self.INDEX_KEY, {key: time.time()})
+            # 顺带清掉索引中已过期的 key
+            pipe.zremrangebyscore(self.INDEX_KEY, 0, time.time() - self.ttl_seconds)
+            pipe.zcard(self.INDEX_KEY)
+            *_, entries = await pipe.execute()
+        if entries > self.max_entries:
+            evicted = await self.client.zpopmin(self.INDEX_KEY, entries - self.max_entries)
+            if evicted:
+                await self.client.delete(*[self.KEY_PREFIX + member.decode("utf-8") for member, _ in evicted])
+
+    async def stats(self) -> Dict[str, int]:
+        counters = await self.client.hgetall(self.STATS_KEY)  # type: ignore
+        return {
+            "hits": int(counters.get(b"hits", 0)),
+            "misses": int(counters.get(b"misses", 0)),
+            "entries": await self.client.zcard(self.INDEX_KEY),
+        }
+
+
+completion_cache = CompletionCache(
+    async_redis_client,
+    ttl_seconds=CONFIG.CHAT.COMPLETION_CACHE_TTL_SECONDS,
+    max_entries=CONFIG.CHAT.COMPLETION_CACHE_MAX_ENTRIES,
+    max_bytes=CONFIG.CHAT.COMPLETION_CACHE_MAX_BYTES,
+)
+
+
+async def get_cached_completion(key: str) -> ChatCompletion | None:
+    try:
+        return await completion_cache.get(key)
+    except Exception as e:
+        logging.error(f"read completion cache error:{e}")
+        return None
+
+
+async def cache_completion(key: str, completion: ChatCompletion):
+    # 只缓存正常结束的回答,截断或被过滤的结果不复用
+    if not completion.choices or completion.choices[0].finish_reason != "stop":
+        return
+    try:
+        await completion_cache.set(key, completion)
+    except Exception as e:
+        logging.error(f"write completion cache error:{e}")
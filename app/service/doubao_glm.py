@@ -1,6 +1,7 @@
-from typing import List
-from volcenginesdkarkruntime import Ark
-from volcenginesdkarkruntime.types.chat import ChatCompletionMessageParam,ChatCompletion
+from typing import AsyncIterator, Dict, List
+from volcenginesdkarkruntime import Ark, AsyncArk
+from volcenginesdkarkruntime.types.chat import ChatCompletionMessageParam,ChatCompletion,ChatCompletionChunk
+from app import models
 
 
 
@@ -29,3 +30,68 @@ class DouBaoGLM():
         return completion # type: ignore
 
 
+class AsyncDouBaoGLM():
+    def __init__(self,api_key:str,model:str):
+        self.api_key=api_key
+        self.model= model
+        self.client = AsyncArk(api_key=self.api_key)
+
+    async def chat(self,messages:List[ChatCompletionMessageParam],max_tokens:int=4096) ->ChatCompletion :
+
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            messages = messages,
+            max_tokens=max_tokens,
+            stream=False
+        )
+        return completion # type: ignore
+
+    async def chat_stream(self,messages:List[ChatCompletionMessageParam],max_tokens:int=4096) ->AsyncIterator[ChatCompletionChunk] :
+        """
+        流式对话,逐个返回增量的 chunk
+        """
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages = messages,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream: # type: ignore
+            yield chunk
+
+    async def close(self):
+        await self.client.close()
+
+
+class DouBaoGLMRegistry():
+    """
+    进程级的 AsyncDouBaoGLM 注册表,按 ApiConfigDouBaoGLM.id 复用客户端及其 keep-alive 连接池
+    """
+
+    def __init__(self):
+        self._clients: Dict[int, AsyncDouBaoGLM] = {}
+        # api_key 变更后被替换下来的客户端,可能仍有请求在使用,关闭时统一释放
+        self._retired: List[AsyncDouBaoGLM] = []
+
+    def get(self, config: models.ApiConfigDouBaoGLM) -> AsyncDouBaoGLM:
+        config_id: int = config.id  # type: ignore
+        glm = self._clients.get(config_id)
+        if glm is not None and glm.api_key != config.api_key:
+            self._retired.append(glm)
+            glm = None
+        if glm is None:
+            glm = AsyncDouBaoGLM(config.api_key, config.model)  # type: ignore
+            self._clients[config_id] = glm
+        glm.model = config.model  # type: ignore
+        return glm
+
+    async def close(self):
+        clients = list(self._clients.values()) + self._retired
+        self._clients = {}
+        self._retired = []
+        for glm in clients:
+            await glm.close()
+
+
+glm_registry = DouBaoGLMRegistry()
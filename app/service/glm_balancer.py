@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, AsyncIterator, Deque, Dict, Iterator, List, Sequence
+from volcenginesdkarkruntime.types.chat import ChatCompletion, ChatCompletionChunk
+from app import models
+from app.core.config import CONFIG
+from app.service.admission import AdmissionError, admission_controller
+from app.service.circuit_breaker import CircuitBreaker
+from app.service.doubao_glm import glm_registry
+from app.service.usage_accounting import usage_accumulator
+
+# 计算对冲延迟时保留的最近延迟样本数
+LATENCY_WINDOW = 200
+
+
+@dataclass
+class KeyStats:
+    breaker: CircuitBreaker
+    latency_ewma: float | None = None
+    error_rate: float = 0.0
+    outstanding: int = 0
+    ejected_until: float = 0.0
+    ejections: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+
+class KeyCall:
+    """
+    一次上游调用的计时;流式调用在收到首个 chunk 时调用 mark,以首包耗时作为延迟
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency: float | None = None
+
+    def mark(self):
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+
+def is_throttled_or_server_error(e: BaseException) -> bool:
+    status_code = getattr(e, "status_code", None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+class GLMBalancer:
+    """
+    按延迟 EWMA、错误率和进行中请求数在启用的豆包 key 之间分配请求,返回 429/5xx 的 key 暂时摘除,
+    连续失败的 key 由熔断器拦截
+    """
+
+    def __init__(
+        self,
+        strategy: str,
+        alpha: float,
+        eject_seconds: float,
+        max_eject_seconds: float,
+        breaker_failure_threshold: int,
+        breaker_reset_seconds: float,
+        breaker_half_open_max_calls: int,
+    ):
+        self.strategy = strategy
+        self.alpha = alpha
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.breaker_half_open_max_calls = breaker_half_open_max_calls
+        self._stats: Dict[int, KeyStats] = {}
+
+    def _get_stats(self, config_id: int) -> KeyStats:
+        if (stats := self._stats.get(config_id)) is None:
+            breaker = CircuitBreaker(
+                self.breaker_failure_threshold,
+                self.breaker_reset_seconds,
+                self.breaker_half_open_max_calls,
+            )
+            stats = self._stats[config_id] = KeyStats(breaker)
+        return stats
+
+    def _available(self, config_id: int, now: float) -> bool:
+        stats = self._get_stats(config_id)
+        return stats.ejected_until <= now and stats.breaker.allow_request()
+
+    def _allowed(self, config_id: int) -> bool:
+        return self._get_stats(config_id).breaker.allow_request()
+
+    def _score(self, stats: KeyStats) -> float:
+        # 没有延迟样本的 key 得分为 0,优先被选中以尽快得到样本
+        latency = stats.latency_ewma or 0.0
+        return latency * (stats.outstanding + 1) / max(1.0 - stats.error_rate, 0.1)
+
+    def choose(
+        self,
+        configs: Sequence[models.ApiConfigDouBaoGLM],
+        exclude: Sequence[int] = (),
+    ) -> models.ApiConfigDouBaoGLM | None:
+        """
+        全部 key 被摘除时退回到熔断器仍放行的 key;所有 key 都熔断时抛出 AdmissionError,不再请求上游
+        """
+        configs = [config for config in configs if config.id not in exclude]
+        if not configs:
+            return None
+        now = time.monotonic()
+        candidates = [config for config in configs if self._available(config.id, now)]  # type: ignore
+        if not candidates:
+            candidates = [config for config in configs if self._allowed(config.id)]  # type: ignore
+        if not candidates:
+            raise AdmissionError("all upstream keys are open")
+        if self.strategy == "least_outstanding":
+            return min(
+                candidates,
+                key=lambda config: (self._get_stats(config.id).outstanding, self._score(self._get_stats(config.id))),  # type: ignore
+            )
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        if self._score(self._get_stats(second.id)) < self._score(self._get_stats(first.id)):  # type: ignore
+            return second
+        return first
+
+    def hedge_delay(self, config_id: int, percentile: float, min_delay: float) -> float:
+        """
+        对冲请求的等待时间,取该 key 最近延迟的分位数,样本不足时使用 min_delay
+        """
+        latencies = sorted(self._get_stats(config_id).latencies)
+        if len(latencies) < 20:
+            return min_delay
+        return max(latencies[min(int(len(latencies) * percentile), len(latencies) - 1)], min_delay)
+
+    @contextmanager
+    def track(self, config_id: int) -> Iterator[KeyCall]:
+        """
+        熔断器不放行(open 或 half_open 探测名额已用完)时抛出 AdmissionError
+        """
+        stats = self._get_stats(config_id)
+        if not stats.breaker.allow_request():
+            raise AdmissionError(f"upstream key {config_id} is open")
+        stats.outstanding += 1
+        probe = stats.breaker.on_start()
+        call = KeyCall()
+        try:
+            yield call
+        except Exception as e:
+            self._record_failure(config_id, stats, e)
+            raise
+        except BaseException:
+            # 被取消(对冲落败或客户端断开)不计入成功或失败,但已等待的时间至少是它的延迟
+            stats.breaker.on_cancel(probe)
+            if call.latency is None:
+                self._record_cancelled(stats, time.monotonic() - call.started)
+            raise
+        else:
+            call.mark()
+            self._record_success(stats, call.latency)  # type: ignore
+        finally:
+            stats.outstanding -= 1
+
+    def _record_success(self, stats: KeyStats, latency: float):
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency
+        else:
+            stats.latency_ewma += self.alpha * (latency - stats.latency_ewma)
+        stats.latencies.append(latency)
+        stats.error_rate *= 1 - self.alpha
+        stats.ejections = 0
+        stats.breaker.on_success()
+
+    def _record_cancelled(self, stats: KeyStats, elapsed: float):
+        if stats.latency_ewma is None:
+            stats.latency_ewma = elapsed
+        elif elapsed > stats.latency_ewma:
+            stats.latency_ewma += self.alpha * (elapsed - stats.latency_ewma)
+
+    def _record_failure(self, config_id: int, stats: KeyStats, e: Exception):
+        status_code = getattr(e, "status_code", None)
+        # 其他 4xx 是请求本身的问题,不计入 key 的错误率
+        if status_code is not None and not is_throttled_or_server_error(e):
+            return
+        stats.error_rate += self.alpha * (1.0 - stats.error_rate)
+        stats.breaker.on_failure()
+        if is_throttled_or_server_error(e):
+            eject_seconds = min(self.eject_seconds * 2**stats.ejections, self.max_eject_seconds)
+            stats.ejected_until = time.monotonic() + eject_seconds
+            stats.ejections += 1
+            logging.warning(f"Eject doubao api config {config_id} for {eject_seconds}s, status code {status_code}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "api_config_id": config_id,
+                "latency_ewma_ms": None if stats.latency_ewma is None else round(stats.latency_ewma * 1000, 1),
+                "error_rate": round(stats.error_rate, 4),
+                "outstanding": stats.outstanding,
+                "ejected_seconds": round(max(stats.ejected_until - now, 0.0), 1),
+                "breaker": stats.breaker.stats(),
+            }
+            for config_id, stats in sorted(self._stats.items())
+        ]
+
+
+glm_balancer = GLMBalancer(
+    strategy=CONFIG.UPSTREAM.BALANCER_STRATEGY,
+    alpha=CONFIG.UPSTREAM.BALANCER_EWMA_ALPHA,
+    eject_seconds=CONFIG.UPSTREAM.BALANCER_EJECT_SECONDS,
+    max_eject_seconds=CONFIG.UPSTREAM.BALANCER_MAX_EJECT_SECONDS,
+    breaker_failure_threshold=CONFIG.UPSTREAM.BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_seconds=CONFIG.UPSTREAM.BREAKER_RESET_SECONDS,
+    breaker_half_open_max_calls=CONFIG.UPSTREAM.BREAKER_HALF_OPEN_MAX_CALLS,
+)
+
+
+def admit(config: models.ApiConfigDouBaoGLM, user_id: int | None) -> AsyncContextManager:
+    """
+    占用该 key 的一个准入名额,排队时间不计入上游延迟
+    """
+    if not CONFIG.UPSTREAM.ADMISSION_ENABLED:
+        return nullcontext()
+    return admission_controller.slot(config, user_id)
+
+
+async def chat_once(
+    config: models.ApiConfigDouBaoGLM,
+    messages,
+    user_id: int | None = None,
+    **kwargs,
+) -> ChatCompletion:
+    async with admit(config, user_id):
+        with glm_balancer.track(config.id):  # type: ignore
+            completion = await asyncio.wait_for(
+                glm_registry.get(config).chat(messages, **kwargs),
+                CONFIG.UPSTREAM.REQUEST_TIMEOUT_SECONDS,
+            )
+    usage_accumulator.record(user_id, config.id, config.model, completion.usage)  # type: ignore
+    return completion
+
+
+async def chat(
+    config: models.ApiConfigDouBaoGLM,
+    messages,
+    alternatives: Sequence[models.ApiConfigDouBaoGLM] = (),
+    user_id: int | None = None,
+    **kwargs,
+) -> ChatCompletion:
+    """
+    请求上游并限制总耗时;开启对冲时,若超过该 key 的 p95 延迟仍未返回,
+    再向 alternatives 中另一个 key 发出同样的请求,先成功的结果生效,另一个被取消
+    """
+    if not CONFIG.UPSTREAM.HEDGING_ENABLED or len(alternatives) < 2:
+        return await chat_once(config, messages, user_id, **kwargs)
+    tasks = [asyncio.ensure_future(chat_once(config, messages, user_id, **kwargs))]
+    try:
+        delay = glm_balancer.hedge_delay(
+            config.id,  # type: ignore
+            CONFIG.UPSTREAM.HEDGING_PERCENTILE,
+            CONFIG.UPSTREAM.HEDGING_MIN_DELAY_SECONDS,
+        )
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+        try:
+            hedge_config = glm_balancer.choose(alternatives, exclude=[config.id])  # type: ignore
+        except AdmissionError:
+            hedge_config = None
+        if hedge_config is None:
+            return await tasks[0]
+        tasks.append(asyncio.ensure_future(chat_once(hedge_config, messages, user_id, **kwargs)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        # 都失败时抛出主请求的异常
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def chat_stream(
+    config: models.ApiConfigDouBaoGLM,
+    messages,
+    user_id: int | None = None,
+    max_tokens: int = 4096,
+) -> AsyncIterator[ChatCompletionChunk]:
+    """
+    流式请求上游,首个 chunk 受 REQUEST_TIMEOUT_SECONDS 限制,之后每个 chunk 的间隔受 STREAM_IDLE_TIMEOUT_SECONDS 限制
+    """
+    async with admit(config, user_id):
+        with glm_balancer.track(config.id) as call:  # type: ignore
+            stream = glm_registry.get(config).chat_stream(messages, max_tokens)
+            timeout = CONFIG.UPSTREAM.REQUEST_TIMEOUT_SECONDS
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    call.mark()
+                    timeout = CONFIG.UPSTREAM.STREAM_IDLE_TIMEOUT_SECONDS
+                    # 开启 include_usage 后最后一个 chunk 携带整次请求的用量
+                    usage_accumulator.record(user_id, config.id, config.model, chunk.usage)  # type: ignore
+                    yield chunk
+            finally:
+                await stream.aclose()  # type: ignore
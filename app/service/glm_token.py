@@ -1,41 +1,105 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Sequence
 import tiktoken
 
-def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613"):
-    """Return the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model in {
-        "gpt-3.5-turbo-0613",
-        "gpt-3.5-turbo-16k-0613",
-        "gpt-4-0314",
-        "gpt-4-32k-0314",
-        "gpt-4-0613",
-        "gpt-4-32k-0613",
-    }:
-        tokens_per_message = 3
-        tokens_per_name = 1
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif "gpt-3.5-turbo" in model:
-        print("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
-    elif "gpt-4" in model:
-        print("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
-    else:
-        raise NotImplementedError(
-            f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens."""
-        )
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
+DEFAULT_MODEL = "gpt-3.5-turbo-0613"
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@dataclass(frozen=True)
+class MessageOverhead:
+    """每条消息在内容之外额外占用的 token 数"""
+
+    tokens_per_message: int
+    tokens_per_name: int
+    # every reply is primed with <|start|>assistant<|message|>
+    tokens_per_reply: int = 3
+
+
+# 计数与所选模型无关:存库的 token_count 在各个 key/模型之间共用,路由时模型也尚未选定,
+# 因此所有调用方都按 DEFAULT_MODEL 的编码和下面的开销计数
+DEFAULT_OVERHEAD = MessageOverhead(tokens_per_message=3, tokens_per_name=1)
+
+
+class Tokenizer:
+    def __init__(self, encoding: tiktoken.Encoding, overhead: MessageOverhead):
+        self.encoding = encoding
+        self.overhead = overhead
+
+    def count_message(self, message: Mapping[str, str]) -> int:
+        """Return the number of tokens a single message adds to a list of messages."""
+        num_tokens = self.overhead.tokens_per_message
         for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
+            num_tokens += len(self.encoding.encode(value))
             if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
\ No newline at end of file
+                num_tokens += self.overhead.tokens_per_name
+        return num_tokens
+
+    def count_messages(self, messages: Iterable[Mapping[str, str]]) -> int:
+        """Return the number of tokens used by a list of messages."""
+        return (
+            sum(self.count_message(message) for message in messages)
+            + self.overhead.tokens_per_reply
+        )
+
+    def encode_batch(self, messages: Sequence[Mapping[str, str]]) -> List[int]:
+        """
+        批量计算每条消息的 token 数,一次性交给 tiktoken 多线程编码
+        """
+        texts = [value for message in messages for value in message.values()]
+        encoded = iter(self.encoding.encode_batch(texts))
+        counts = []
+        for message in messages:
+            num_tokens = self.overhead.tokens_per_message
+            for key in message:
+                num_tokens += len(next(encoded))
+                if key == "name":
+                    num_tokens += self.overhead.tokens_per_name
+            counts.append(num_tokens)
+        return counts
+
+
+class TokenizerRegistry:
+    """
+    按模型名缓存 Tokenizer,每个进程内 tiktoken 编码只加载一次
+    """
+
+    def __init__(self, overhead: MessageOverhead = DEFAULT_OVERHEAD):
+        self.overhead = overhead
+        self._tokenizers: Dict[str, Tokenizer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str = DEFAULT_MODEL) -> Tokenizer:
+        tokenizer = self._tokenizers.get(model)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = self._tokenizers.get(model)
+                if tokenizer is None:
+                    tokenizer = Tokenizer(self._load_encoding(model), self.overhead)
+                    self._tokenizers[model] = tokenizer
+        return tokenizer
+
+    def warm_up(self, models: Iterable[str] = (DEFAULT_MODEL,)):
+        for model in models:
+            self.get(model)
+
+    def _load_encoding(self, model: str) -> tiktoken.Encoding:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            logging.info(f"No tiktoken encoding for model {model}, using {DEFAULT_ENCODING}")
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+tokenizer_registry = TokenizerRegistry()
+
+
+def num_tokens_from_messages(messages, model=DEFAULT_MODEL):
+    """Return the number of tokens used by a list of messages."""
+    return tokenizer_registry.get(model).count_messages(messages)
+
+
+def num_tokens_from_message(message, model=DEFAULT_MODEL):
+    """Return the number of tokens a single message adds to a list of messages."""
+    return tokenizer_registry.get(model).count_message(message)
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+from app import models
+from app.core.config import CONFIG
+
+
+@dataclass
+class Route:
+    configs: List[models.ApiConfigDouBaoGLM]
+    max_tokens: int
+
+
+class ModelRouter:
+    """
+    按提示词长度在启用的豆包 key 中挑选候选:短提示优先走 fast 标签的模型,长历史走 long-context 标签的模型,
+    并排除上下文放不下本次请求的模型;同一候选集合内再由负载均衡选择具体的 key
+    """
+
+    def __init__(
+        self,
+        short_prompt_tokens: int,
+        fast_tag: str,
+        long_context_tag: str,
+        min_completion_tokens: int,
+    ):
+        self.short_prompt_tokens = short_prompt_tokens
+        self.fast_tag = fast_tag
+        self.long_context_tag = long_context_tag
+        self.min_completion_tokens = min_completion_tokens
+
+    def _fits(self, config: models.ApiConfigDouBaoGLM, prompt_tokens: int) -> bool:
+        return config.max_context is None or config.max_context - prompt_tokens >= self.min_completion_tokens  # type: ignore
+
+    def route(
+        self,
+        configs: Sequence[models.ApiConfigDouBaoGLM],
+        prompt_tokens: int,
+        max_tokens: int,
+    ) -> Route:
+        candidates = [config for config in configs if self._fits(config, prompt_tokens)]
+        if not candidates:
+            # 都放不下时退回到上下文最长的模型,由上游决定是否截断
+            longest = max(config.max_context for config in configs)  # type: ignore
+            candidates = [config for config in configs if config.max_context == longest]
+        tag = self.fast_tag if prompt_tokens <= self.short_prompt_tokens else self.long_context_tag
+        if preferred := [config for config in candidates if tag in (config.tags or [])]:  # type: ignore
+            candidates = preferred
+        # 输出长度不超过候选模型中最小的剩余上下文
+        for config in candidates:
+            if config.max_context is not None:
+                max_tokens = min(max_tokens, max(config.max_context - prompt_tokens, self.min_completion_tokens))  # type: ignore
+        return Route(candidates, max_tokens)
+
+
+model_router = ModelRouter(
+    short_prompt_tokens=CONFIG.UPSTREAM.ROUTING_SHORT_PROMPT_TOKENS,
+    fast_tag=CONFIG.UPSTREAM.ROUTING_FAST_TAG,
+    long_context_tag=CONFIG.UPSTREAM.ROUTING_LONG_CONTEXT_TAG,
+    min_completion_tokens=CONFIG.UPSTREAM.ROUTING_MIN_COMPLETION_TOKENS,
+)
+
+
+def resolve_max_tokens(requested: int | None) -> int:
+    """
+    客户端指定的 max_tokens,超出上限时截断;未指定时使用默认值
+    """
+    if requested is None:
+        return CONFIG.UPSTREAM.DEFAULT_MAX_TOKENS
+    return min(requested, CONFIG.UPSTREAM.MAX_TOKENS_LIMIT)
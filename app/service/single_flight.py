@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict
+from redis import asyncio as aioredis
+from volcenginesdkarkruntime.types.chat import ChatCompletion
+from app.core.config import CONFIG
+from app.core.redis_client import async_redis_client
+
+
+class SingleFlight:
+    """
+    合并相同请求的并发上游调用,同一个 key 同时只有一个调用在进行,其余请求等待并共享它的结果
+
+    进程内用 task 字典合并;开启 Redis 时再用 SET NX 锁跨 worker 合并,
+    持有锁的 worker 把结果短暂写入 Redis,其他 worker 轮询读取,锁释放后仍无结果则自行调用
+    """
+
+    LOCK_PREFIX = "chat:singleflight:lock:"
+    RESULT_PREFIX = "chat:singleflight:result:"
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        redis_enabled: bool,
+        lock_ttl_ms: int,
+        wait_seconds: float,
+        poll_interval_seconds: float,
+        result_ttl_ms: int = 10000,
+    ):
+        self.client = client
+        self.redis_enabled = redis_enabled
+        self.lock_ttl_ms = lock_ttl_ms
+        self.wait_seconds = wait_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.result_ttl_ms = result_ttl_ms
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.remote_coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[ChatCompletion]]) -> ChatCompletion:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._call(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        # 单个请求被取消不影响共享同一调用的其他请求
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 所有等待者都已取消时避免出现 "exception was never retrieved"
+            task.exception()
+
+    async def _call(self, key: str, fn: Callable[[], Awaitable[ChatCompletion]]) -> ChatCompletion:
+        if not self.redis_enabled:
+            return await fn()
+        try:
+            token = uuid.uuid4().hex
+            acquired = await self.client.set(self.LOCK_PREFIX + key, token, nx=True, px=self.lock_ttl_ms)
+        except Exception as e:
+            logging.error(f"acquire single flight lock error:{e}")
+            return await fn()
+        if acquired:
+            return await self._lead(key, token, fn)
+        if (completion := await self._follow(key)) is not None:
+            self.remote_coalesced += 1
+            return completion
+        return await fn()
+
+    async def _lead(self, key: str, token: str, fn: Callable[[], Awaitable[ChatCompletion]]) -> ChatCompletion:
+        lock_key = self.LOCK_PREFIX + key
+        try:
+            completion = await fn()
+            try:
+                await self.client.set(self.RESULT_PREFIX + key, completion.model_dump_json(), px=self.result_ttl_ms)
+            except Exception as e:
+                logging.error(f"write single flight result error:{e}")
+            return completion
+        finally:
+            try:
+                if await self.client.get(lock_key) == token.encode("utf-8"):
+                    await self.client.delete(lock_key)
+            except Exception as e:
+                logging.error(f"release single flight lock error:{e}")
+
+    async def _follow(self, key: str) -> ChatCompletion | None:
+        """
+        等待其他 worker 的结果,超时或对方失败时返回 None
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        try:
+            while time.monotonic() < deadline:
+                if data := await self.client.get(self.RESULT_PREFIX + key):
+                    return ChatCompletion.model_validate_json(data)
+                if not await self.client.exists(self.LOCK_PREFIX + key):
+                    return None
+                await asyncio.sleep(self.poll_interval_seconds)
+        except Exception as e:
+            logging.error(f"wait single flight result error:{e}")
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "remote_coalesced": self.remote_coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+chat_single_flight = SingleFlight(
+    async_redis_client,
+    redis_enabled=CONFIG.CHAT.SINGLE_FLIGHT_REDIS_ENABLED,
+    lock_ttl_ms=CONFIG.CHAT.SINGLE_FLIGHT_LOCK_TTL_MS,
+    wait_seconds=CONFIG.CHAT.SINGLE_FLIGHT_WAIT_SECONDS,
+    poll_interval_seconds=CONFIG.CHAT.SINGLE_FLIGHT_POLL_INTERVAL_SECONDS,
+)
@@ -0,0 +1,78 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+from volcenginesdkarkruntime.types.completion_usage import CompletionUsage
+from app import crud, schemas
+from app.core.database import SessionLocal
+
+# (user_id, api_config_id, model, hour)
+UsageKey = Tuple[int, int, str, datetime]
+
+
+class UsageAccumulator:
+    """
+    在内存中按 (用户, key, 模型, 小时) 累加上游返回的 usage,由定时任务批量写入 ai_usage_rollups
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rollups: Dict[UsageKey, List[int]] = {}
+
+    def record(self, user_id: int | None, api_config_id: int, model: str, usage: CompletionUsage | None):
+        if usage is None:
+            return
+        hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        key = (user_id or 0, api_config_id, model, hour)
+        with self._lock:
+            counters = self._rollups.setdefault(key, [0, 0, 0, 0])
+            counters[0] += 1
+            counters[1] += usage.prompt_tokens
+            counters[2] += usage.completion_tokens
+            counters[3] += usage.total_tokens
+
+    def flush(self):
+        """
+        写入当前累计的用量;写库失败时放回内存,等待下次合并写入
+        """
+        with self._lock:
+            rollups, self._rollups = self._rollups, {}
+        if not rollups:
+            return
+        db = SessionLocal()
+        try:
+            crud.upsert_ai_usage_rollups(
+                db,
+                [
+                    schemas.AiUsageRollupCreate(
+                        user_id=user_id,
+                        api_config_id=api_config_id,
+                        model=model,
+                        hour=hour,
+                        requests=counters[0],
+                        prompt_tokens=counters[1],
+                        completion_tokens=counters[2],
+                        total_tokens=counters[3],
+                    )
+                    for (user_id, api_config_id, model, hour), counters in rollups.items()
+                ],
+            )
+        except Exception as e:
+            logging.error(f"flush usage rollups error:{e}")
+            self._merge(rollups)
+        finally:
+            db.close()
+
+    def _merge(self, rollups: Dict[UsageKey, List[int]]):
+        with self._lock:
+            for key, counters in rollups.items():
+                current = self._rollups.setdefault(key, [0, 0, 0, 0])
+                for i, value in enumerate(counters):
+                    current[i] += value
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rollups)
+
+
+usage_accumulator = UsageAccumulator()
@@ -0,0 +1,196 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+import redis
+from redis import asyncio as aioredis
+from app import models, schemas
+from app.core.config import CONFIG
+from app.core.redis_client import async_redis_client, redis_client, redis_subscriber
+
+
+def dump_user(user: models.User) -> Dict[str, Any]:
+    """
+    取出认证需要的字段,不含 hashed_password
+    """
+    return {field: getattr(user, field) for field in schemas.User.model_fields}
+
+
+def build_user(data: Dict[str, Any]) -> schemas.User:
+    return schemas.User.model_validate(data)
+
+
+class UserCache:
+    """
+    已认证用户的两级缓存,按 username 存放:进程内 LRU 在前,Redis 在后,均只保留几秒
+
+    缓存的是不含 hashed_password 的 schemas.User,需要密码或最新数据的接口应自行查库;
+    用户被修改或删除时由 crud 调用 invalidate,并通过 Redis 频道通知其他进程清除本地副本
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        async_client: aioredis.Redis,
+        channel: str,
+        max_size: int,
+        local_ttl_seconds: float,
+        redis_ttl_seconds: int,
+        enabled: bool = True,
+    ):
+        self.client = client
+        self.async_client = async_client
+        self.channel = channel
+        self.max_size = max_size
+        self.local_ttl_seconds = local_ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.enabled = enabled
+        self._local: OrderedDict[str, Tuple[float, schemas.User]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, username: str) -> str:
+        return f"auth:user:{username}"
+
+    def get(self, username: str, load: Callable[[], models.User | None]) -> schemas.User | None:
+        """
+        依次查本地 LRU、Redis,都未命中时调用 load 查库并回填;用户不存在时不缓存
+        """
+        if not self.enabled:
+            return self._from_db(load())
+        if (user := self._get_local(username)) is not None:
+            return user
+        try:
+            if (raw := self.client.get(self._key(username))) is not None:
+                return self._hit_redis(username, raw)  # type: ignore
+        except Exception as e:
+            logging.error(f"read user cache error:{e}")
+        self.misses += 1
+        if (db_user := load()) is None:
+            return None
+        data = dump_user(db_user)
+        try:
+            self.client.set(self._key(username), self._dumps(data), ex=self.redis_ttl_seconds)
+        except Exception as e:
+            logging.error(f"fill user cache error:{e}")
+        return self._put_local(username, data)
+
+    async def aget(
+        self, username: str, load: Callable[[], Awaitable[models.User | None]]
+    ) -> schemas.User | None:
+        """
+        get 的异步版本,Redis 和数据库均使用异步客户端
+        """
+        if not self.enabled:
+            return self._from_db(await load())
+        if (user := self._get_local(username)) is not None:
+            return user
+        try:
+            if (raw := await self.async_client.get(self._key(username))) is not None:
+                return self._hit_redis(username, raw)
+        except Exception as e:
+            logging.error(f"read user cache error:{e}")
+        self.misses += 1
+        if (db_user := await load()) is None:
+            return None
+        data = dump_user(db_user)
+        try:
+            await self.async_client.set(self._key(username), self._dumps(data), ex=self.redis_ttl_seconds)
+        except Exception as e:
+            logging.error(f"fill user cache error:{e}")
+        return self._put_local(username, data)
+
+    def invalidate(self, username: str):
+        self.evict_local(username)
+        try:
+            self.client.delete(self._key(username))
+            self.client.publish(self.channel, username)
+        except Exception as e:
+            logging.error(f"invalidate user cache error:{e}")
+
+    async def ainvalidate(self, username: str):
+        self.evict_local(username)
+        try:
+            await self.async_client.delete(self._key(username))
+            await self.async_client.publish(self.channel, username)
+        except Exception as e:
+            logging.error(f"invalidate user cache error:{e}")
+
+    def evict_local(self, username: str):
+        with self._lock:
+            self._local.pop(username, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+        }
+
+    def _from_db(self, db_user: models.User | None) -> schemas.User | None:
+        return build_user(dump_user(db_user)) if db_user is not None else None
+
+    def _get_local(self, username: str) -> schemas.User | None:
+        with self._lock:
+            item = self._local.get(username)
+            if item is None:
+                return None
+            expires_at, user = item
+            if expires_at <= time.monotonic():
+                del self._local[username]
+                return None
+            self._local.move_to_end(username)
+            self.local_hits += 1
+            return user
+
+    def _put_local(self, username: str, data: Dict[str, Any]) -> schemas.User:
+        user = build_user(data)
+        with self._lock:
+            self._local[username] = (time.monotonic() + self.local_ttl_seconds, user)
+            self._local.move_to_end(username)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+        return user
+
+    def _hit_redis(self, username: str, raw: bytes) -> schemas.User:
+        self.redis_hits += 1
+        return self._put_local(username, self._loads(raw))
+
+    def _dumps(self, data: Dict[str, Any]) -> str:
+        return json.dumps(
+            {key: value.isoformat() if isinstance(value, datetime) else value for key, value in data.items()},
+            ensure_ascii=False,
+        )
+
+    def _loads(self, raw: bytes) -> Dict[str, Any]:
+        # 时间字段由 schemas.User 校验时从 ISO 字符串解析
+        return json.loads(raw)
+
+
+user_cache = UserCache(
+    redis_client.client,
+    async_redis_client,
+    channel=CONFIG.AUTH.USER_CACHE_INVALIDATE_CHANNEL,
+    max_size=CONFIG.AUTH.USER_CACHE_MAX_SIZE,
+    local_ttl_seconds=CONFIG.AUTH.USER_CACHE_LOCAL_TTL_SECONDS,
+    redis_ttl_seconds=CONFIG.AUTH.USER_CACHE_REDIS_TTL_SECONDS,
+    enabled=CONFIG.AUTH.USER_CACHE_ENABLED,
+)
+
+# 重连期间可能错过失效通知,订阅成功后清空本地副本
+redis_subscriber.subscribe(
+    user_cache.channel,
+    lambda username: user_cache.evict_local(username.decode("utf-8")),
+    on_connect=user_cache.clear_local,
+)
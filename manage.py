@@ -451,6 +451,84 @@ def create(name: str):
     create_schema_module(name)
 
 
+def migrate():
+    """
+    为已存在的表补充模型中新增的列和索引(create_all 只会创建缺失的表)
+    """
+    from sqlalchemy import String, inspect, text
+    from sqlalchemy.schema import CreateColumn
+    from app.core.compression import CompressedText
+    from app.core.database import Base, engine
+    import app.models  # 导入时会创建缺失的表
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                if column.name in existing_columns:
+                    # 压缩内容列由 TEXT 改为二进制,原有内容按 UTF-8 字节保留,读取时兼容
+                    if isinstance(column.type, CompressedText) and isinstance(
+                        existing_columns[column.name]["type"], String
+                    ):
+                        conn.execute(text(f"ALTER TABLE {table.name} MODIFY COLUMN {column_ddl}"))
+                        print(f"Changed column {table.name}.{column.name} to binary")
+                    continue
+                # 带默认值的列(如 created_at)加列时,已有行由 MySQL 填为加列时刻
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                print(f"Added column {table.name}.{column.name}")
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(conn)
+                print(f"Added index {index.name} on {table.name}")
+
+
+def backfill_token_count(batch_size: int = 500):
+    """
+    为历史聊天消息补算 token_count
+    """
+    from app import crud
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        after_id = 0
+        while True:
+            last_id = crud.backfill_ai_chat_message_token_count(db, after_id, batch_size)
+            if last_id is None:
+                break
+            after_id = last_id
+            print(f"Backfilled token_count up to id {last_id}")
+        print("Backfill finished.")
+    finally:
+        db.close()
+
+
+def recompress_messages(batch_size: int = 500):
+    """
+    压缩全部仍为明文或旧 base64 格式的聊天消息,并输出压缩比
+    """
+    from app import crud
+    from app.core.compression import compression_stats
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        after_id = 0
+        while True:
+            last_id, compressed = crud.recompress_ai_chat_messages(db, after_id, batch_size)
+            if last_id is None:
+                break
+            after_id = last_id
+            print(f"Compressed {compressed} messages up to id {last_id}")
+        print(f"Recompress finished: {compression_stats.snapshot()}")
+    finally:
+        db.close()
+
+
 # 命令列表
 commands = [
     {
@@ -516,6 +594,38 @@ commands = [
             }
         ],
     },
+    {
+        "name": "migrate",
+        "func": migrate,
+        "help": "Add new columns and indexes to existing tables.",
+        "params": [],
+    },
+    {
+        "name": "backfill_token_count",
+        "func": backfill_token_count,
+        "help": "Fill token_count for existing chat messages.",
+        "params": [
+            {
+                "name": "batch_size",
+                "type": int,
+                "help": "Number of messages to update per transaction.",
+                "default": 500,
+            }
+        ],
+    },
+    {
+        "name": "recompress_messages",
+        "func": recompress_messages,
+        "help": "Compress existing plain-text chat messages.",
+        "params": [
+            {
+                "name": "batch_size",
+                "type": int,
+                "help": "Number of messages to update per transaction.",
+                "default": 500,
+            }
+        ],
+    },
     {
         "name": "backup",
         "func": save_folder_to_py,